@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Structured access log for server.py, plus an analyzer for it
+Request threads only append a dict to an in-memory queue; a background
+thread serialises the records and appends them to a JSON-lines file in batches
+
+Usage:
+    python access_log.py [logs/access.log ...] [--top N]
+"""
+
+import os
+import sys
+import json
+import atexit
+import threading
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+
+# Write after this many queued records, or this many seconds, whichever first
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+# Records beyond this many unwritten ones are dropped (and counted) rather than queued
+MAX_PENDING = 50000
+
+DEFAULT_LOG = 'logs/access.log'
+DEFAULT_TOP = 10
+# A range starting this close to where the previous response stopped continues it
+# (the client may not have consumed what was still in flight when it aborted)
+SEEK_TOLERANCE = 1024 * 1024
+
+
+class AccessLog:
+    """Write-behind JSON-lines access log
+
+    ``write()`` never touches the file: deque appends are atomic, so the
+    request path takes no lock. Each flush appends the whole batch with one
+    write() on an O_APPEND file, so several processes can share the log and
+    a rotated file is simply recreated on the next flush.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def write(self, record):
+        """Queue one record (a JSON-serialisable dict)"""
+        pending = len(self._queue)
+        if pending >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.append(record)
+        self._ensure_writer()
+        if pending + 1 >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        """Append every queued record to the log file"""
+        with self._flush_lock:
+            lines = []
+            try:
+                while True:
+                    lines.append(json.dumps(self._queue.popleft(), ensure_ascii=False,
+                                            separators=(',', ':')))
+            except IndexError:
+                pass
+            if not lines:
+                return
+            data = ('\n'.join(lines) + '\n').encode('utf-8')
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                print(f"Error writing access log: {e}")
+
+    def close(self):
+        """Stop the writer thread and write out anything still queued"""
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+    def _ensure_writer(self):
+        """Start the background writer on first use"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        """Flush on a timer, or early when a batch fills up"""
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def read_records(paths):
+    """Yield the records of one or more log files, skipping damaged lines"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _covered(intervals):
+    """Total length of a list of inclusive (start, end) intervals, overlaps counted once"""
+    total, reach = 0, -1
+    for start, end in sorted(intervals):
+        if end > reach:
+            total += end - max(start, reach + 1) + 1
+            reach = end
+    return total
+
+
+def analyze(records):
+    """Summarise access log records
+
+    Returns a dict with per-file totals (``files``), the kinds of range
+    requests seen (``seeks``), where in the file range requests start
+    (``seek_positions``, by tenth of the file) and ``wasted`` bytes: those
+    sent on responses the client aborted, and those a client was sent again
+    for a part of the file it had already received.
+    """
+    files = defaultdict(lambda: {'requests': 0, 'bytes_sent': 0, 'aborted': 0, 'ranges': 0})
+    seeks = Counter()
+    seek_positions = Counter()
+    received = defaultdict(list)     # (client, path) -> byte intervals sent to it
+    last_end = {}                    # (client, path) -> last byte of the previous response
+    aborted_bytes = 0
+    total_bytes = 0
+
+    for record in records:
+        path = record.get('path')
+        sent = record.get('bytes_sent') or 0
+        stats = files[path]
+        stats['requests'] += 1
+        stats['bytes_sent'] += sent
+        total_bytes += sent
+        if record.get('aborted'):
+            stats['aborted'] += 1
+            aborted_bytes += sent
+
+        ranges = record.get('ranges')
+        size = record.get('size') or 0
+        if record.get('status') not in (200, 206) or not size:
+            continue
+        key = (record.get('client'), path)
+        # Only the bytes that actually went out count as received
+        sent_intervals = []
+        remaining = sent
+        for range_start, range_end in ranges or [(0, size - 1)]:
+            if remaining <= 0:
+                break
+            length = min(range_end - range_start + 1, remaining)
+            sent_intervals.append((range_start, range_start + length - 1))
+            remaining -= length
+        received[key].extend(sent_intervals)
+        previous = last_end.get(key)
+        if sent_intervals:
+            last_end[key] = sent_intervals[-1][1]
+        if not ranges:
+            continue
+
+        stats['ranges'] += 1
+        start = ranges[0][0]
+        if len(ranges) > 1:
+            seeks['multi-range'] += 1
+        elif start == 0:
+            seeks['from start'] += 1
+        elif previous is None:
+            seeks['first request mid-file'] += 1
+        elif abs(start - (previous + 1)) <= SEEK_TOLERANCE:
+            seeks['continuation'] += 1
+        elif start > previous:
+            seeks['forward seek'] += 1
+        else:
+            seeks['backward seek'] += 1
+        seek_positions[min(start * 10 // size, 9)] += 1
+
+    resent = sum(sum(end - start + 1 for start, end in intervals) - _covered(intervals)
+                 for intervals in received.values())
+    return {
+        'requests': sum(stats['requests'] for stats in files.values()),
+        'bytes_sent': total_bytes,
+        'files': dict(files),
+        'seeks': dict(seeks),
+        'seek_positions': dict(seek_positions),
+        'wasted': {'aborted': aborted_bytes, 'resent': resent},
+    }
+
+
+def _size(n):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def main(argv):
+    """Print a report for the given log files (default logs/access.log)"""
+    top = DEFAULT_TOP
+    paths = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--top':
+            top = int(next(args, DEFAULT_TOP))
+        else:
+            paths.append(Path(arg))
+    summary = analyze(read_records(paths or [Path(DEFAULT_LOG)]))
+
+    print(f"📊 {summary['requests']} request(s), {_size(summary['bytes_sent'])} sent\n")
+
+    print(f"🔥 Hot files (top {top} by bytes sent)")
+    hot = sorted(summary['files'].items(), key=lambda item: item[1]['bytes_sent'], reverse=True)
+    for path, stats in hot[:top]:
+        print(f"  {_size(stats['bytes_sent']):>10}  {stats['requests']:>6} req  "
+              f"{stats['ranges']:>6} range  {stats['aborted']:>5} aborted  {path}")
+
+    print("\n⏩ Range requests")
+    for kind, count in sorted(summary['seeks'].items(), key=lambda item: -item[1]):
+        print(f"  {count:>8}  {kind}")
+    positions = summary['seek_positions']
+    if positions:
+        print("  Start position in file:")
+        for decile in range(10):
+            print(f"    {decile * 10:>3}-{decile * 10 + 9}%  {positions.get(decile, 0)}")
+
+    wasted = summary['wasted']
+    total = summary['bytes_sent'] or 1
+    print("\n🗑️  Wasted bytes")
+    print(f"  {_size(wasted['aborted']):>10}  sent on responses the client aborted "
+          f"({wasted['aborted'] * 100 / total:.1f}%)")
+    print(f"  {_size(wasted['resent']):>10}  re-sent to a client that already had them "
+          f"({wasted['resent'] * 100 / total:.1f}%)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
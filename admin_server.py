@@ -5,19 +5,37 @@ Flask-based content management system with session authentication
 """
 
 import os
-import json
+import gzip
 import secrets
-from datetime import datetime, timedelta
+import time
+import mimetypes
+from datetime import timedelta
 from pathlib import Path
-from werkzeug.utils import secure_filename
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory
+from werkzeug.security import safe_join
+from flask import Flask, Response, abort, g, render_template, request, jsonify, session, redirect, url_for, send_file
 from dotenv import load_dotenv
 
+from byte_ranges import (RangeNotSatisfiable, entity_tag, if_range_allows, iter_file_segments,
+                         parse_range_header, plan_range_response)
+from http_cache import cache_control_for, is_not_modified
+from precompressed import encoded_etag, is_compressible, negotiate, precompress_tree
+from visit_counter import VisitCounter
+from content_store import BatchError, ContentStore
+from response_cache import VersionedCache, make_payload
+from feed_render import FEED_HELPERS, FEED_PAGE_SIZE, inject_feed
+from chunked_uploads import ChunkedUploads, UploadError
+from image_variants import VARIANT_WIDTHS, VariantPipeline, original_for_variant, variant_name
+from faststart import VideoPipeline, poster_name, prepare_upload
+from upload_store import UploadStore, clean_filename
+from file_cache import FileCache
+import metrics
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(32))
+app.jinja_env.globals.update(FEED_HELPERS)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
 
@@ -25,6 +43,7 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / 'data'
 UPLOAD_DIR = BASE_DIR / 'uploads'
+PRIVATE_DIRS = {'data', 'logs'}  # Inside BASE_DIR but never served
 TEMPLATES_DIR = BASE_DIR / 'templates'
 
 # Create directories if they don't exist
@@ -32,48 +51,135 @@ DATA_DIR.mkdir(exist_ok=True)
 UPLOAD_DIR.mkdir(exist_ok=True)
 TEMPLATES_DIR.mkdir(exist_ok=True)
 
-CONTENT_FILE = DATA_DIR / 'content.json'
+PARTIAL_UPLOAD_DIR = DATA_DIR / 'partial_uploads'
+CONTENT_FILE = DATA_DIR / 'content.json'  # Legacy store, imported into CONTENT_DB once
+CONTENT_DB = DATA_DIR / 'content.db'
 VISIT_COUNTER_FILE = DATA_DIR / 'visit_counter.json'
+visit_counter = VisitCounter(VISIT_COUNTER_FILE)  # In memory, written to disk in batches
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+BOOTSTRAP_GZIP_MIN = 1024   # Smaller /api/bootstrap bodies are sent as they are
+BOOTSTRAP_GZIP_LEVEL = 5    # Compressed per request, so favour speed
+UPLOAD_RELEASE_GRACE = 3600   # Seconds a just-used upload survives losing its last reference
+# Uploads no content references and nobody has used for this long are swept away
+UPLOAD_ORPHAN_GRACE = int(os.getenv('UPLOAD_ORPHAN_GRACE', '86400'))
+UPLOAD_SWEEP_INTERVAL = 3600
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi', 'pdf', 'doc', 'docx', 'txt', 'zip'}
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def load_content():
-    """Load content from JSON file"""
-    if CONTENT_FILE.exists():
-        with open(CONTENT_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+content_store = ContentStore(CONTENT_DB, legacy_json=CONTENT_FILE)
+chunked_uploads = ChunkedUploads(PARTIAL_UPLOAD_DIR)
+upload_store = UploadStore(UPLOAD_DIR, ALLOWED_EXTENSIONS, prepare=prepare_upload)  # One file per distinct SHA-256
+image_pipeline = VariantPipeline()  # Responsive image widths, rendered on a process pool
+video_pipeline = VideoPipeline()  # Poster frames for uploaded videos
+response_cache = VersionedCache()  # Serialized + gzipped API bodies, keyed by content version
+file_cache = FileCache()  # Open descriptors and stat results of hot static/upload files
 
-def save_content(content):
-    """Save content to JSON file"""
-    with open(CONTENT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(content, f, indent=2, ensure_ascii=False)
+def load_content():
+    """Load all content, newest first"""
+    return content_store.list()
 
 def load_visit_count():
-    """Load visit count from JSON file"""
-    if VISIT_COUNTER_FILE.exists():
-        with open(VISIT_COUNTER_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('count', 0)
-    return 0
-
-def save_visit_count(count):
-    """Save visit count to JSON file"""
-    with open(VISIT_COUNTER_FILE, 'w', encoding='utf-8') as f:
-        json.dump({
-            'count': count,
-            'last_updated': datetime.now().isoformat()
-        }, f, indent=2)
+    """Return the current visit count"""
+    return visit_counter.count
 
 def increment_visit_count():
     """Increment and return visit count"""
-    count = load_visit_count()
-    count += 1
-    save_visit_count(count)
-    return count
+    return visit_counter.increment()
+
+def send_ranged_file(directory, filename):
+    """Serve a file like send_from_directory, adding suffix, multi-range and If-Range
+    support, conditional GET, precompressed variants and the per-path Cache-Control policy"""
+    path = safe_join(str(directory), filename)
+    f = file_cache.open(path) if path is not None else None
+    if f is None:
+        abort(404)
+    
+    st = f.stat
+    etag = entity_tag(st)
+    # Ranges always refer to the identity bytes, so only whole-file requests get a variant
+    encoded = None if 'Range' in request.headers else negotiate(
+        path, st, request.headers.get('Accept-Encoding'), stat=file_cache.stat)
+    variant = file_cache.open(encoded[1]) if encoded else None
+    if variant is not None:
+        etag = encoded_etag(etag, encoded[0])
+    
+    if is_not_modified(request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since'),
+                       etag, st.st_mtime):
+        f.close()
+        if variant is not None:
+            variant.close()
+        response = Response(status=304)
+        response.set_etag(etag.strip('"'))
+        response.last_modified = st.st_mtime
+    elif variant is not None:
+        f.close()
+        response = _send_cached_file(variant, path, etag, st.st_mtime)
+        response.headers['Content-Encoding'] = encoded[0]
+    else:
+        response = _ranged_file_response(f, path, etag)
+    
+    if is_compressible(path):
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cache_control_for(request.path)
+    return response
+
+def _send_cached_file(f, path, etag, mtime):
+    """Whole-file 200 response streaming an open CachedFile"""
+    response = send_file(f, download_name=os.path.basename(path), etag=etag.strip('"'),
+                         last_modified=mtime, conditional=False)
+    response.content_length = f.stat.st_size
+    response.accept_ranges = 'bytes'
+    return response
+
+def _ranged_file_response(f, path, etag):
+    """Build the 200/206/416 response for send_ranged_file"""
+    st = f.stat
+    ranges = None
+    range_header = request.headers.get('Range')
+    if range_header and if_range_allows(request.headers.get('If-Range'), etag, st.st_mtime):
+        try:
+            ranges = parse_range_header(range_header, st.st_size)
+        except RangeNotSatisfiable:
+            f.close()
+            return Response(status=416, headers={'Content-Range': f'bytes */{st.st_size}'})
+    
+    if not ranges:
+        # Share our validators so If-Range/If-None-Match agree across both servers
+        return _send_cached_file(f, path, etag, st.st_mtime)
+    
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    body_type, segments, length, content_range = plan_range_response(ranges, st.st_size, content_type)
+    response = Response(iter_file_segments(f, segments), status=206, content_type=body_type)
+    # The generator never starts for HEAD or a client gone before the first chunk
+    response.call_on_close(f.close)
+    response.headers['Content-Length'] = str(length)
+    if content_range:
+        response.headers['Content-Range'] = content_range
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag.strip('"'))
+    response.last_modified = st.st_mtime
+    return response
+
+def send_payload(payload, mimetype='application/json'):
+    """Send a pre-built Payload, gzipped when accepted, or 304 if the client has it"""
+    use_gzip = request.accept_encodings['gzip'] > 0
+    etag = payload.gzip_etag if use_gzip else payload.etag
+    
+    if is_not_modified(request.headers.get('If-None-Match'), None, etag, 0):
+        response = Response(status=304)
+    else:
+        response = Response(payload.gzipped if use_gzip else payload.body, mimetype=mimetype)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 def check_auth():
     """Check if user is authenticated (session or API token)"""
@@ -91,6 +197,64 @@ def check_auth():
     
     return False
 
+@app.before_request
+def start_request_timer():
+    """Note when the request arrived, for the latency histogram"""
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the response; file bodies are finished when the server closes them"""
+    # Captured now - the request context is gone by the time a stream closes
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    method = request.method
+    started = g.get('request_started', time.perf_counter())
+    sent = 0 if method == 'HEAD' else (response.content_length or 0)
+    
+    def record():
+        metrics.record_request('admin', route, method, response.status_code,
+                               time.perf_counter() - started, sent)
+    
+    if response.is_streamed:
+        metrics.OPEN_STREAMS.inc('admin')
+        
+        def finished():
+            metrics.OPEN_STREAMS.dec('admin')
+            record()
+        on_body_closed(response, finished)
+    else:
+        record()
+    return response
+
+def on_body_closed(response, func):
+    """Run ``func`` once the server has finished sending the response body
+    
+    send_file() responses are passed straight through to the server, which
+    skips Response.call_on_close(), so the hook goes on the file wrapper's
+    own close() instead - wrapping it would stop servers that recognise
+    wsgi.file_wrapper from using sendfile.
+    """
+    body = response.response
+    if not (response.direct_passthrough and hasattr(body, 'close')):
+        response.call_on_close(func)
+        return
+    close = body.close
+    
+    def close_and_notify():
+        try:
+            close()
+        finally:
+            func()
+    body.close = close_and_notify
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target (Bearer METRICS_TOKEN when that is set)"""
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE,
+                    headers={'Cache-Control': 'no-store'})
+
 @app.route('/')
 def index():
     """Redirect to main site"""
@@ -98,18 +262,57 @@ def index():
 
 @app.route('/index.html')
 def main_site():
-    """Serve the main site"""
-    return send_from_directory(BASE_DIR, 'index.html')
+    """Serve the main site with the first page of the feed already rendered in"""
+    tags = tuple(request.args.getlist('tag'))
+    try:
+        payload = index_payload(tags)
+    except FileNotFoundError:
+        abort(404)
+    return send_payload(payload, mimetype='text/html')
+
+def index_payload(tags=()):
+    """index.html with the first feed page rendered in, cached until content or the file changes"""
+    index_path = BASE_DIR / 'index.html'
+    
+    def build():
+        items, next_cursor = content_store.page(FEED_PAGE_SIZE, tags=tags)
+        fragment = render_template('feed_cards.html', items=items, next_cursor=next_cursor)
+        html = inject_feed(index_path.read_text(encoding='utf-8'), fragment)
+        return make_payload(html.encode('utf-8'))
+    
+    st = index_path.stat()
+    version = (content_store.version(), st.st_mtime_ns, st.st_size)
+    return response_cache.get(('index', tags), version, build)
+
+def refresh_index():
+    """Re-render the unfiltered front page right after a content write"""
+    try:
+        index_payload()
+    except OSError as e:
+        print(f"Error pre-rendering index.html: {e}")
 
 @app.route('/<path:path>')
 def serve_static(path):
     """Serve static files"""
-    return send_from_directory(BASE_DIR, path)
+    full_path = safe_join(str(BASE_DIR), path)
+    if full_path is None or os.path.relpath(full_path, BASE_DIR).split(os.sep, 1)[0] in PRIVATE_DIRS:
+        abort(404)
+    return send_ranged_file(BASE_DIR, path)
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """Serve uploaded files"""
-    return send_from_directory(UPLOAD_DIR, filename)
+    original = original_for_variant(filename)
+    if original and not (UPLOAD_DIR / filename).exists():
+        # Variant requested before the pool finished rendering it
+        image_pipeline.wait(original)
+        if not (UPLOAD_DIR / filename).exists():
+            response = send_ranged_file(UPLOAD_DIR, original)
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+    # No-op unless this is a poster still being extracted in this process
+    video_pipeline.wait(filename)
+    return send_ranged_file(UPLOAD_DIR, filename)
 
 @app.route('/admin')
 def admin():
@@ -160,9 +363,82 @@ def increment_visit():
 
 @app.route('/api/content', methods=['GET'])
 def get_content():
-    """Get all content"""
-    content = load_content()
-    return jsonify(content)
+    """Get content (served from the response cache until content changes)
+    
+    Without query parameters returns the full list. With ``limit``, ``cursor``
+    or ``tag`` returns one page: ``{"items": [...], "next_cursor": ...}``.
+    """
+    if not any(key in request.args for key in ('limit', 'cursor', 'tag')):
+        payload = response_cache.get('content', content_store.version(),
+                                     lambda: make_payload(app.json.dumps(load_content()).encode('utf-8')))
+        return send_payload(payload)
+    
+    limit, tags = page_args()
+    try:
+        payload = content_page_payload(limit, request.args.get('cursor') or None, tags)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return send_payload(payload)
+
+def page_args():
+    """``(limit, tags)`` from the query string, with limit clamped to MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE)), tuple(request.args.getlist('tag'))
+
+def content_page_payload(limit, cursor, tags):
+    """Payload for one feed page; raises ValueError for a malformed cursor"""
+    def build_page():
+        items, next_cursor = content_store.page(limit, cursor=cursor, tags=tags)
+        return make_payload(app.json.dumps({'items': items, 'next_cursor': next_cursor}).encode('utf-8'))
+    
+    if cursor is None:
+        # First pages are what every visitor loads - keep them cached
+        return response_cache.get(('content-page', limit, tags), content_store.version(), build_page)
+    return build_page()
+
+@app.route('/api/search', methods=['GET'])
+def search_content():
+    """Full-text search over titles and bodies: ?q=...&limit=&offset=
+    
+    Returns ``{"items": [...], "next_offset": ...}`` ranked by relevance;
+    each item also has a ``snippet`` of the matching text.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Missing search query'}), 400
+    
+    limit, _ = page_args()
+    offset = max(0, request.args.get('offset', 0, type=int))
+    try:
+        items, next_offset = content_store.search(query, limit, offset)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'items': items, 'next_offset': next_offset})
+
+@app.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    """Everything a page view needs in one response
+    
+    Returns the auth state, the visit count after counting this visit and
+    the first content page (``limit``/``tag`` as for /api/content). The page
+    comes pre-serialized from the response cache and is spliced in as
+    bytes. ``?content=0`` leaves it out for pages that were pre-rendered.
+    """
+    head = app.json.dumps({'authenticated': check_auth(), 'visits': increment_visit_count()}).encode('utf-8')
+    if request.args.get('content') == '0':
+        body = head
+    else:
+        limit, tags = page_args()
+        body = head[:-1] + b', "content": ' + content_page_payload(limit, None, tags).body + b'}'
+    
+    response = Response(body, mimetype='application/json')
+    if len(body) >= BOOTSTRAP_GZIP_MIN and request.accept_encodings['gzip'] > 0:
+        response.set_data(gzip.compress(body, BOOTSTRAP_GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding, Cookie, Authorization'
+    # Counts a visit and depends on who is asking - never reuse it
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/api/content', methods=['POST'])
 def create_content():
@@ -171,23 +447,11 @@ def create_content():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
     data = request.get_json()
-    content = load_content()
-    
-    # Generate unique ID
-    new_id = max([c.get('id', 0) for c in content], default=0) + 1
-    
-    new_content = {
-        'id': new_id,
-        'title': data.get('title', ''),
-        'body': data.get('body', ''),
-        'tag': data.get('tag', 'Story'),
-        'date': data.get('date', datetime.now().strftime('%B %Y')),
-        'media': data.get('media', []),
-        'created_at': datetime.now().isoformat()
-    }
-    
-    content.insert(0, new_content)  # Add to beginning
-    save_content(content)
+    try:
+        new_content = content_store.create(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    refresh_index()
     
     return jsonify({'success': True, 'content': new_content})
 
@@ -198,22 +462,18 @@ def update_content(content_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
     data = request.get_json()
-    content = load_content()
-    
-    for i, c in enumerate(content):
-        if c['id'] == content_id:
-            content[i].update({
-                'title': data.get('title', c['title']),
-                'body': data.get('body', c['body']),
-                'tag': data.get('tag', c['tag']),
-                'date': data.get('date', c['date']),
-                'media': data.get('media', c['media']),
-                'updated_at': datetime.now().isoformat()
-            })
-            save_content(content)
-            return jsonify({'success': True, 'content': content[i]})
-    
-    return jsonify({'success': False, 'message': 'Content not found'}), 404
+    released = set()
+    try:
+        updated = content_store.update(content_id, data, released=released)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    remove_released_uploads(released)
+    
+    if updated is None:
+        return jsonify({'success': False, 'message': 'Content not found'}), 404
+    refresh_index()
+    
+    return jsonify({'success': True, 'content': updated})
 
 @app.route('/api/content/<int:content_id>', methods=['DELETE'])
 def delete_content(content_id):
@@ -221,18 +481,128 @@ def delete_content(content_id):
     if not check_auth():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    content = load_content()
-    content = [c for c in content if c['id'] != content_id]
-    save_content(content)
+    released = set()
+    content_store.delete(content_id, released=released)
+    remove_released_uploads(released)
+    refresh_index()
     
     return jsonify({'success': True})
 
+@app.route('/api/content/batch', methods=['POST'])
+def batch_content():
+    """Apply a list of create/update/delete operations in one transaction
+    
+    Body: {"operations": [{"op": "create", "data": {...}},
+                          {"op": "update", "id": 3, "data": {...}},
+                          {"op": "delete", "id": 4}]}
+    Either every operation is applied or none is.
+    """
+    if not check_auth():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    released = set()
+    try:
+        results = content_store.batch(operations, released=released)
+    except BatchError as e:
+        return jsonify({'success': False, 'message': e.message, 'index': e.index}), e.status
+    remove_released_uploads(released)
+    refresh_index()
+    
+    return jsonify({'success': True, 'results': results})
+
+def remove_released_uploads(filenames):
+    """Delete uploads no content references any more, with their variants and poster
+    
+    Uploads used within UPLOAD_RELEASE_GRACE seconds are kept; the sweep
+    collects them once they have been idle for UPLOAD_ORPHAN_GRACE.
+    """
+    for filename in filenames:
+        remove_upload(filename, UPLOAD_RELEASE_GRACE)
+    if time.monotonic() - last_upload_sweep[0] >= UPLOAD_SWEEP_INTERVAL:
+        sweep_orphan_uploads()
+
+def remove_upload(filename, grace):
+    """Delete a stored upload unused for ``grace`` seconds, with its variants and poster"""
+    if not upload_store.remove(filename, grace=grace):
+        return
+    derived = [variant_name(filename, width) for width in VARIANT_WIDTHS] + [poster_name(filename)]
+    for name in derived:
+        (UPLOAD_DIR / name).unlink(missing_ok=True)
+
+last_upload_sweep = [float('-inf')]  # monotonic time of this process's last sweep
+
+def sweep_orphan_uploads():
+    """Delete stored uploads no content references that nobody has used for UPLOAD_ORPHAN_GRACE
+    
+    Runs at startup and, at most every UPLOAD_SWEEP_INTERVAL seconds, after
+    content changes. It collects files whose last reference went during
+    their grace period as well as uploads never used in a post.
+    """
+    last_upload_sweep[0] = time.monotonic()
+    try:
+        idle = upload_store.idle_names(UPLOAD_ORPHAN_GRACE)
+    except OSError as e:
+        print(f"Error sweeping unused uploads: {e}")
+        return
+    for filename in content_store.unreferenced(idle):
+        remove_upload(filename, UPLOAD_ORPHAN_GRACE)
+
+def uploaded_media_info(filename, digest, duplicate=False, original=None):
+    """Upload API response for a file saved in UPLOAD_DIR
+    
+    ``duplicate`` is True when the bytes were already stored and nothing
+    new was written. ``original`` is the name the client uploaded the file
+    as; it is returned cleaned as ``original_filename``, the name to show
+    for the media (``filename`` is the stored, hash-based name).
+    Images also get their dimensions and responsive variants, videos get
+    their moov/mdat/keyframe layout and a poster URL. Variants and posters
+    are produced in the background; all of it should be stored with the
+    media entry.
+    """
+    info = {
+        'success': True,
+        'filename': filename,
+        'url': f'/uploads/{filename}',
+        'type': media_type_for(filename),
+        'sha256': digest,
+        'duplicate': duplicate
+    }
+    original = clean_filename(original)
+    if original:
+        info['original_filename'] = original
+    if info['type'] == 'image':
+        info.update(image_pipeline.submit(UPLOAD_DIR / filename, '/uploads/') or {})
+    elif info['type'] == 'video':
+        info.update(video_pipeline.submit(UPLOAD_DIR / filename, '/uploads/') or {})
+    return info
+
+def media_type_for(filename):
+    """Determine file type from the extension"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ['.jpg', '.jpeg', '.png', '.gif']:
+        return 'image'
+    elif ext in ['.mp4', '.mov', '.avi']:
+        return 'video'
+    return 'file'
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Handle file uploads"""
+    """Handle file uploads
+    
+    The file is hashed while it is written and stored under its SHA-256.
+    A client that sends the hash up front in an ``X-Content-SHA256`` header
+    gets an immediate answer, before the body is read, if it is already stored.
+    """
     if not check_auth():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
+    digest = request.headers.get('X-Content-SHA256', '').lower()
+    existing = upload_store.find(digest)
+    if existing:
+        return jsonify(uploaded_media_info(existing, digest, duplicate=True))
+    
     if 'file' not in request.files:
         return jsonify({'success': False, 'message': 'No file provided'}), 400
     
@@ -245,40 +615,102 @@ def upload_file():
         return jsonify({'success': False, 'message': 'File type not allowed'}), 400
     
     if file:
-        filename = secure_filename(file.filename)
-        # Add timestamp and random suffix to avoid conflicts
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        random_suffix = secrets.token_hex(4)
-        name, ext = os.path.splitext(filename)
-        filename = f"{name}_{timestamp}_{random_suffix}{ext}"
-        
-        filepath = UPLOAD_DIR / filename
-        file.save(filepath)
-        
-        # Determine file type
-        ext = ext.lower()
-        if ext in ['.jpg', '.jpeg', '.png', '.gif']:
-            file_type = 'image'
-        elif ext in ['.mp4', '.mov', '.avi']:
-            file_type = 'video'
-        else:
-            file_type = 'file'
-        
-        return jsonify({
-            'success': True,
-            'filename': filename,
-            'url': f'/uploads/{filename}',
-            'type': file_type
-        })
+        filename, digest, duplicate = upload_store.save_stream(file.stream, file.filename)
+        metrics.record_upload('simple', request.content_length or 0,
+                              time.perf_counter() - g.request_started)
+        return jsonify(uploaded_media_info(filename, digest, duplicate, original=file.filename))
     
     return jsonify({'success': False, 'message': 'File type not allowed'}), 400
 
+@app.errorhandler(UploadError)
+def handle_upload_error(error):
+    """Report chunked upload errors in the API's usual JSON shape"""
+    return jsonify({'success': False, 'message': error.message, **error.details}), error.status
+
+@app.route('/api/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    """Start a resumable upload: {"filename", "size", "sha256" (optional)}
+    
+    If ``sha256`` matches a stored file the upload is complete already and
+    the normal upload response is returned instead of an upload id.
+    """
+    if not check_auth():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    
+    if not filename or not allowed_file(filename):
+        return jsonify({'success': False, 'message': 'File type not allowed'}), 400
+    
+    digest = str(data.get('sha256') or '').lower()
+    existing = upload_store.find(digest)
+    if existing:
+        return jsonify(uploaded_media_info(existing, digest, duplicate=True, original=filename))
+    
+    status = chunked_uploads.start(filename, data.get('size'), data.get('sha256'))
+    return jsonify({'success': True, **status})
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Report how many bytes have been received, for resuming"""
+    if not check_auth():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    return jsonify({'success': True, **chunked_uploads.status(upload_id)})
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append the request body at ?offset= (must equal the bytes received so far)
+    
+    An ``X-Content-SHA256`` header with the chunk's digest makes the server
+    keep the chunk only if it arrived intact (422 otherwise).
+    """
+    if not check_auth():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'message': 'offset query parameter required'}), 400
+    
+    new_offset = chunked_uploads.write_chunk(upload_id, offset, request.stream,
+                                             request.headers.get('X-Content-SHA256'))
+    metrics.record_upload('chunked', new_offset - offset, time.perf_counter() - g.request_started)
+    return jsonify({'success': True, 'offset': new_offset})
+
+@app.route('/api/upload/chunked/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """Verify the checksum and publish the file under /uploads/"""
+    if not check_auth():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    status = chunked_uploads.status(upload_id)
+    tmp_path = upload_store.temp_path()
+    digest = chunked_uploads.finish(upload_id, tmp_path, data.get('sha256'))
+    filename, duplicate = upload_store.adopt(tmp_path, digest, status['filename'])
+    
+    return jsonify(uploaded_media_info(filename, digest, duplicate, original=status['filename']))
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['DELETE'])
+def cancel_chunked_upload(upload_id):
+    """Discard a partial upload"""
+    if not check_auth():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    chunked_uploads.cancel(upload_id)
+    return jsonify({'success': True})
+
 if __name__ == '__main__':
     # Get configuration from environment with safe defaults
     debug_mode = os.getenv('DEBUG', 'True').lower() == 'true'
     host = os.getenv('HOST', '127.0.0.1')  # Default to localhost for security
     port = int(os.getenv('PORT', '5000'))
     
+    # Refresh .br/.gz copies of the site's text assets (no-op when up to date)
+    precompress_tree(BASE_DIR)
+    sweep_orphan_uploads()
+    
     print("🚀 Srisin Admin Server")
     print(f"📡 Server running at http://{host}:{port}")
     print(f"🔐 Admin panel at http://{host}:{port}/admin")
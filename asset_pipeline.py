@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted static asset URLs
+Copies css/ and js/ files to content-hashed names (style.<hash>.css), writes
+asset-manifest.json and points index.html and the templates at the copies,
+so browsers can cache them forever and never revalidate
+
+Usage:
+    python asset_pipeline.py          # build step - rewrites the HTML in place
+
+Run it on a build copy of the site (the Dockerfile does); the rewrite is
+idempotent, so running it again after an edit just moves the references to
+the new hashes. precompressed.py should run afterwards.
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+from pathlib import Path
+
+ASSET_DIRS = ('css', 'js')
+ASSET_EXTENSIONS = {'.css', '.js'}
+HTML_FILES = ('index.html', 'templates/*.html')
+MANIFEST_NAME = 'asset-manifest.json'
+HASH_LENGTH = 10
+
+# style.3f2a9c1b7e.css -> style + .css
+FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.[0-9a-f]{%d}(?P<ext>\.[A-Za-z0-9]+)$' % HASH_LENGTH)
+
+# href="css/style.css", src="/js/player.js?v=2" - local asset references only, never CDN URLs
+ASSET_REFERENCE = re.compile(
+    r'''(?P<attr>\b(?:href|src)=)(?P<quote>["'])(?P<slash>/?)(?P<path>(?:%s)/[^"'?#]+)(?P<rest>[^"']*)(?P=quote)'''
+    % '|'.join(ASSET_DIRS)
+)
+
+
+def logical_path(rel_path):
+    """Strip a fingerprint from a relative asset path: css/style.<hash>.css -> css/style.css"""
+    directory, name = os.path.split(rel_path)
+    match = FINGERPRINTED.match(name)
+    if match:
+        name = match.group('stem') + match.group('ext')
+    return f"{directory}/{name}" if directory else name
+
+
+def fingerprint(path):
+    """Short content hash used in fingerprinted names"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+
+def _source_assets(root):
+    """Relative paths of the assets to fingerprint (originals only)"""
+    for directory in ASSET_DIRS:
+        for path in sorted((root / directory).rglob('*')):
+            rel = path.relative_to(root).as_posix()
+            if path.is_file() and path.suffix in ASSET_EXTENSIONS and logical_path(rel) == rel:
+                yield rel
+
+
+def build_manifest(root):
+    """Write fingerprinted copies and the manifest; return {logical path: fingerprinted path}
+
+    Fingerprinted copies that are not in the new manifest are removed,
+    together with their .gz/.br variants.
+    """
+    root = Path(root)
+    manifest = {}
+    for rel in _source_assets(root):
+        stem, ext = os.path.splitext(rel)
+        target = f"{stem}.{fingerprint(root / rel)}{ext}"
+        target_path = root / target
+        if not target_path.exists():
+            tmp = target_path.with_name(target_path.name + '.tmp')
+            tmp.write_bytes((root / rel).read_bytes())
+            os.replace(tmp, target_path)
+        manifest[rel] = target
+
+    current = set(manifest.values())
+    for directory in ASSET_DIRS:
+        for path in (root / directory).rglob('*'):
+            rel = path.relative_to(root).as_posix()
+            if path.suffix in ASSET_EXTENSIONS and logical_path(rel) != rel and rel not in current:
+                for stale in (path, path.with_name(path.name + '.gz'), path.with_name(path.name + '.br')):
+                    stale.unlink(missing_ok=True)
+
+    tmp = root / (MANIFEST_NAME + '.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+    os.replace(tmp, root / MANIFEST_NAME)
+    return manifest
+
+
+def rewrite_references(html, manifest):
+    """Point every local css/js reference in ``html`` at its fingerprinted copy
+
+    Any query string (old-style ?v= cache busters) is dropped, since the
+    name itself now changes with the content.
+    """
+    def replace(match):
+        target = manifest.get(logical_path(match.group('path')))
+        if target is None:
+            return match.group(0)
+        quote = match.group('quote')
+        return f"{match.group('attr')}{quote}{match.group('slash')}{target}{quote}"
+    return ASSET_REFERENCE.sub(replace, html)
+
+
+def rewrite_html_files(root, manifest):
+    """Rewrite the references in index.html and templates/*.html; return the files changed"""
+    root = Path(root)
+    changed = []
+    for pattern in HTML_FILES:
+        for path in sorted(root.glob(pattern)):
+            html = path.read_text(encoding='utf-8')
+            rewritten = rewrite_references(html, manifest)
+            if rewritten != html:
+                tmp = path.with_name(path.name + '.tmp')
+                tmp.write_text(rewritten, encoding='utf-8')
+                os.replace(tmp, path)
+                changed.append(path)
+    return changed
+
+
+if __name__ == '__main__':
+    root = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('.')
+    manifest = build_manifest(root)
+    for source, target in manifest.items():
+        print(f"🔖 {source} -> {target}")
+    changed = rewrite_html_files(root, manifest)
+    print(f"\n✅ {len(manifest)} asset(s) fingerprinted, {len(changed)} HTML file(s) rewritten")
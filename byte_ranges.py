@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Byte range support (RFC 7233) shared by server.py and admin_server.py
+Parses Range headers, validates If-Range and plans single-part or
+multipart/byteranges responses
+"""
+
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+
+# Ranges separated by fewer bytes than a multipart part header are merged
+COALESCE_GAP = 80
+# Headers asking for more ranges than this are ignored (full 200 response)
+MAX_RANGES = 64
+# Read size used when streaming ranges through userspace
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised when a syntactically valid Range header selects no bytes"""
+
+
+def entity_tag(st):
+    """Strong ETag derived from a stat result (mtime and size, no file reads)"""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def http_date(timestamp):
+    """Format a POSIX timestamp as an HTTP-date"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def parse_range_header(header, size):
+    """Parse a Range header into a list of inclusive (start, end) byte ranges
+
+    Handles ``bytes=a-b``, open-ended ``bytes=a-`` and suffix ``bytes=-n``
+    specs, comma separated. Overlapping and nearly adjacent ranges are
+    coalesced. Returns None when the header is malformed or uses another
+    unit, in which case the whole representation should be sent.
+
+    Raises RangeNotSatisfiable when no range overlaps the file.
+    """
+    if not header:
+        return None
+    unit, sep, spec_list = header.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+
+    specs = [spec.strip() for spec in spec_list.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, dash, last = spec.partition('-')
+        first, last = first.strip(), last.strip()
+        if not dash or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            # Suffix range: the final N bytes
+            if not last:
+                return None
+            suffix = int(last)
+            if suffix > 0 and size > 0:
+                ranges.append((max(size - suffix, 0), size - 1))
+            continue
+
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+    return coalesce_ranges(ranges)
+
+
+def coalesce_ranges(ranges, gap=COALESCE_GAP):
+    """Sort ranges and merge those that overlap or are within ``gap`` bytes"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1 + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_allows(if_range, etag, mtime):
+    """Return True if a Range header may be honoured given the If-Range header
+
+    An entity-tag must match the current strong ETag exactly; an HTTP-date
+    must equal the file's Last-Modified second. Anything else means the
+    client's cached copy is stale, so the full representation is sent.
+    """
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('W/'):
+        return False
+    if if_range.startswith('"'):
+        return if_range == etag
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def plan_range_response(ranges, size, content_type):
+    """Describe the body of a 206 response for the given ranges
+
+    Returns ``(content_type, segments, content_length, content_range)``.
+    ``segments`` is a list of literal ``bytes`` and ``(offset, length)``
+    file windows to be written in order. ``content_range`` is None for a
+    multipart/byteranges response, whose ranges are described per part.
+    """
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        length = end - start + 1
+        return content_type, [(start, length)], length, f"bytes {start}-{end}/{size}"
+
+    boundary = secrets.token_hex(16)
+    segments = []
+    total = 0
+    for start, end in ranges:
+        part_header = (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode('latin-1')
+        segments.append(part_header)
+        segments.append((start, end - start + 1))
+        total += len(part_header) + end - start + 1
+    closing = f"\r\n--{boundary}--\r\n".encode('latin-1')
+    segments.append(closing)
+    total += len(closing)
+
+    return f"multipart/byteranges; boundary={boundary}", segments, total, None
+
+
+def iter_file_segments(source, segments, chunk_size=CHUNK_SIZE):
+    """Yield the bytes described by ``segments`` reading windows from ``source``
+
+    ``source`` is a path or an open binary file, which is closed at the end.
+    """
+    with (open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source) as f:
+        for segment in segments:
+            if isinstance(segment, bytes):
+                yield segment
+                continue
+            offset, remaining = segment
+            f.seek(offset)
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Resumable chunked uploads for admin_server.py
+Each chunk is streamed straight into a partial file on disk; an upload can
+be resumed from the last byte received, and each chunk as well as the
+finished file can be checksum-verified
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import secrets
+import threading
+from pathlib import Path
+
+CHUNK_SIZE = 8 * 1024 * 1024          # Suggested client chunk size (below MAX_CONTENT_LENGTH)
+COPY_BUFFER_SIZE = 1024 * 1024        # Bytes read from the request stream at a time
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_CHUNKED_UPLOAD_SIZE', str(20 * 1024 ** 3)))
+STALE_AFTER = 2 * 24 * 60 * 60        # Partial uploads untouched this long are removed
+
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class UploadError(Exception):
+    """Upload request that cannot be honoured; ``status`` is the HTTP status"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details
+
+
+class ChunkedUploads:
+    """Partial uploads kept under ``partial_dir`` as ``<id>.part`` + ``<id>.json``
+
+    Chunks must be sent in order: a PUT at any offset other than the number
+    of bytes already stored is rejected with the current offset, which is
+    also what a client reads back to resume after a dropped connection.
+    A running SHA-256 is kept in memory while chunks arrive in sequence;
+    if it is lost (restart, another worker) finalize re-hashes the file.
+    """
+
+    def __init__(self, partial_dir):
+        self.partial_dir = Path(partial_dir)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self._hashers = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, upload_id):
+        """Return (part_path, meta_path), rejecting malformed ids"""
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+            raise UploadError('Upload not found', 404)
+        return self.partial_dir / f'{upload_id}.part', self.partial_dir / f'{upload_id}.json'
+
+    def _load_meta(self, upload_id):
+        """Read an upload's metadata file"""
+        _, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError('Upload not found', 404) from None
+
+    def start(self, filename, size, sha256=None):
+        """Register a new upload and return its status"""
+        if not isinstance(size, int) or size < 0:
+            raise UploadError('size must be a non-negative integer')
+        if size > MAX_UPLOAD_SIZE:
+            raise UploadError(f'File too large (max {MAX_UPLOAD_SIZE} bytes)', 413)
+        if sha256 is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', str(sha256)):
+            raise UploadError('sha256 must be a hex digest')
+
+        self.remove_stale()
+        upload_id = secrets.token_hex(16)
+        part_path, meta_path = self._paths(upload_id)
+        part_path.touch()
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': time.time(),
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        with self._lock:
+            self._hashers[upload_id] = (0, hashlib.sha256())
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """Return the upload's metadata plus the current byte offset"""
+        meta = self._load_meta(upload_id)
+        part_path, _ = self._paths(upload_id)
+        return {**meta, 'offset': part_path.stat().st_size, 'chunk_size': CHUNK_SIZE}
+
+    def write_chunk(self, upload_id, offset, stream, sha256=None):
+        """Append bytes from ``stream`` at ``offset``; return the new offset
+
+        The stream is copied in COPY_BUFFER_SIZE pieces, so a chunk is never
+        held in memory whole. Bytes received before a disconnect are kept,
+        unless ``sha256`` (the digest of this chunk) is given: then the chunk
+        is kept only if it arrived whole and matches, and is cut off again
+        with a 422 otherwise.
+        """
+        meta = self._load_meta(upload_id)
+        part_path, _ = self._paths(upload_id)
+        if sha256 is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', str(sha256)):
+            raise UploadError('sha256 must be a hex digest')
+
+        with open(part_path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            start = current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadError('Offset does not match bytes received', 409, offset=current)
+
+            with self._lock:
+                hashed_to, hasher = self._hashers.pop(upload_id, (None, None))
+            if hashed_to != current:
+                hasher = None
+            file_hasher = hasher.copy() if hasher is not None else None
+            chunk_hasher = hashlib.sha256() if sha256 else None
+
+            f.seek(current)
+            try:
+                while True:
+                    block = stream.read(COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    if current + len(block) > meta['size']:
+                        raise UploadError('Chunk extends past declared size', 400, offset=current)
+                    f.write(block)
+                    current += len(block)
+                    if file_hasher is not None:
+                        file_hasher.update(block)
+                    if chunk_hasher is not None:
+                        chunk_hasher.update(block)
+                if chunk_hasher is not None and chunk_hasher.hexdigest() != sha256.lower():
+                    raise UploadError('Chunk checksum mismatch', 422, offset=start)
+            except BaseException as error:
+                if chunk_hasher is not None:
+                    # Drop the partial or corrupt chunk so it is sent again whole
+                    f.truncate(start)
+                    current, file_hasher = start, hasher
+                    if isinstance(error, UploadError):
+                        error.details['offset'] = start
+                raise
+            finally:
+                f.flush()
+                if file_hasher is not None:
+                    with self._lock:
+                        self._hashers[upload_id] = (current, file_hasher)
+        return current
+
+    def finish(self, upload_id, destination, sha256=None):
+        """Verify the completed upload and move it to ``destination``
+
+        Returns the SHA-256 hex digest of the file.
+        """
+        meta = self._load_meta(upload_id)
+        part_path, meta_path = self._paths(upload_id)
+        expected = (sha256 or meta.get('sha256') or '').lower() or None
+
+        with open(part_path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            received = os.fstat(f.fileno()).st_size
+            if received != meta['size']:
+                raise UploadError('Upload incomplete', 409, offset=received)
+
+            with self._lock:
+                hashed_to, hasher = self._hashers.pop(upload_id, (None, None))
+            if hashed_to != received:
+                hasher = hashlib.sha256()
+                for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+
+            if expected and digest != expected:
+                with self._lock:
+                    self._hashers[upload_id] = (received, hasher)
+                raise UploadError('Checksum mismatch', 422, sha256=digest)
+
+            # Plain rename when on the same volume, copy otherwise
+            shutil.move(part_path, destination)
+        meta_path.unlink(missing_ok=True)
+        return digest
+
+    def cancel(self, upload_id):
+        """Discard a partial upload"""
+        part_path, meta_path = self._paths(upload_id)
+        self._load_meta(upload_id)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        part_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+
+    def remove_stale(self):
+        """Delete partial uploads that have not been touched for STALE_AFTER seconds"""
+        cutoff = time.time() - STALE_AFTER
+        for meta_path in self.partial_dir.glob('*.json'):
+            part_path = meta_path.with_suffix('.part')
+            try:
+                newest = max(meta_path.stat().st_mtime,
+                             part_path.stat().st_mtime if part_path.exists() else 0)
+            except FileNotFoundError:
+                continue
+            if newest < cutoff:
+                part_path.unlink(missing_ok=True)
+                meta_path.unlink(missing_ok=True)
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed content store for admin_server.py
+Replaces whole-file content.json rewrites with indexed single-row writes
+"""
+
+import os
+import html
+import json
+import atexit
+import base64
+import sqlite3
+import threading
+from html.parser import HTMLParser
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime
+
+from metrics import timed
+
+# Fields a client may set on create/update
+EDITABLE_FIELDS = ('title', 'body', 'tag', 'date', 'media')
+TEXT_FIELDS = ('title', 'body', 'tag', 'date')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    tag TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    media TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL DEFAULT '',
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS content_created_at ON content (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS content_tag ON content (tag, created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS media_refs (
+    filename TEXT NOT NULL,
+    content_id INTEGER NOT NULL,
+    PRIMARY KEY (filename, content_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS media_refs_content ON media_refs (content_id);
+"""
+
+# Full-text index over title and tag-stripped body, rowid = content id. Trigram
+# tokens match inside words, which also covers Thai (no spaces between words);
+# SQLite older than 3.34 has no trigram tokenizer and gets word tokens instead.
+SEARCH_TOKENIZERS = ("trigram", "unicode61 remove_diacritics 2")
+SEARCH_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS content_search USING fts5(title, body, tokenize='{}')"
+SEARCH_TITLE_WEIGHT = 5.0   # bm25 weight of a title hit relative to a body hit
+MIN_TRIGRAM_TERM = 3        # The trigram tokenizer cannot match anything shorter
+# snippet() length is counted in tokens: a trigram token advances one character
+SNIPPET_TOKENS = {True: 64, False: 16}
+
+# PRAGMA user_version: 1 once content.json has been imported, 2 once media_refs
+# is filled, 3 once content_search is filled
+SCHEMA_VERSION = 3
+
+UPLOAD_URL_PREFIX = '/uploads/'
+
+# Fold the write-ahead log back into the database after this many writes
+CHECKPOINT_EVERY = 500
+
+# Operations accepted by ContentStore.batch in one request
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+MAX_BATCH_OPERATIONS = 1000
+
+COLUMNS = 'id, title, body, tag, date, media, created_at, updated_at'
+FEED_ORDER = 'ORDER BY created_at DESC, id DESC'
+
+
+def encode_cursor(item):
+    """Opaque cursor pointing just past ``item`` in feed order"""
+    raw = json.dumps([item['created_at'], item['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) key inside a cursor; ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, content_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(created_at, str) or not isinstance(content_id, int):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return created_at, content_id
+
+
+def media_filenames(media):
+    """Names of the uploaded files a content item's media list points at"""
+    names = set()
+    for entry in media or []:
+        url = entry.get('url', '') if isinstance(entry, dict) else ''
+        if url.startswith(UPLOAD_URL_PREFIX):
+            names.add(url[len(UPLOAD_URL_PREFIX):])
+    return names
+
+
+class BatchError(Exception):
+    """Batch that was rejected as a whole; ``index`` is the offending operation, if any"""
+
+    def __init__(self, message, index=None, status=400):
+        super().__init__(message)
+        self.message = message
+        self.index = index
+        self.status = status
+
+
+def check_content_data(data):
+    """Raise ValueError unless ``data`` is an object whose content fields have the right types"""
+    if not isinstance(data, dict):
+        raise ValueError('data must be an object')
+    for key in TEXT_FIELDS:
+        if key in data and not isinstance(data[key], str):
+            raise ValueError(f'{key} must be a string')
+    if 'media' in data and not isinstance(data['media'], list):
+        raise ValueError('media must be a list')
+
+
+def _check_operation(index, operation):
+    """Raise BatchError unless ``operation`` is a well-formed batch operation"""
+    if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+        raise BatchError(f"op must be one of {', '.join(BATCH_OPERATIONS)}", index)
+    content_id = operation.get('id')
+    if operation['op'] != 'create' and (not isinstance(content_id, int) or isinstance(content_id, bool)):
+        raise BatchError('id must be an integer', index)
+    if operation['op'] != 'delete':
+        try:
+            check_content_data(operation.get('data'))
+        except ValueError as e:
+            raise BatchError(str(e), index) from None
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the text of an HTML fragment, skipping scripts and styles"""
+
+    SKIP = {'script', 'style'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+        self.parts.append(' ')
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def html_to_text(fragment):
+    """Plain text of a TinyMCE body, for indexing"""
+    parser = _TextExtractor()
+    parser.feed(fragment or '')
+    parser.close()
+    return ' '.join(''.join(parser.parts).split())
+
+
+def _row_to_item(row):
+    """Convert a content row into the dict shape the API has always returned"""
+    item = {
+        'id': row[0],
+        'title': row[1],
+        'body': row[2],
+        'tag': row[3],
+        'date': row[4],
+        'media': json.loads(row[5]),
+        'created_at': row[6],
+    }
+    if row[7] is not None:
+        item['updated_at'] = row[7]
+    return item
+
+
+class ContentStore:
+    """Content records in SQLite (WAL mode), newest first
+
+    Each thread gets its own connection. On first open an existing
+    content.json is imported once, preserving ids and timestamps; the JSON
+    file itself is left in place untouched.
+
+    The uploads each item's media points at are mirrored into
+    ``media_refs`` in the same transaction as the item, so the uploads
+    that lose their last reference can be found without scanning content.
+    The title and tag-stripped body are indexed into the ``content_search``
+    FTS5 table the same way, so search never lags behind a write.
+
+    Every mutation is a small record appended to the write-ahead log inside
+    a ``BEGIN IMMEDIATE`` transaction, which holds SQLite's write lock, so
+    writers in other threads and processes queue rather than interleave. A
+    crash mid-write leaves only an uncommitted tail in the log, which SQLite
+    discards when the database is next opened. The log is checkpointed into
+    the main file every CHECKPOINT_EVERY writes and at exit.
+    """
+
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = Path(db_path)
+        self.legacy_json = Path(legacy_json) if legacy_json else None
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._revision = 0
+        self._writes_since_checkpoint = 0
+        self._trigram = True
+
+    def version(self):
+        """Token that changes whenever content is written, here or by another process
+
+        Local writes bump a counter; writes from other processes show up as
+        a changed size or mtime of the database or its write-ahead log.
+        """
+        stamps = []
+        for path in (self.db_path, self.db_path.with_name(self.db_path.name + '-wal')):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return (self._revision, *stamps)
+
+    def _connect(self):
+        """Return this thread's connection, creating the schema on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    self._initialize(conn)
+                    self._initialized = True
+                    atexit.register(self.close)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write under SQLite's write lock, committing on success"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        self._revision += 1
+        self._writes_since_checkpoint += 1
+        if self._writes_since_checkpoint >= CHECKPOINT_EVERY:
+            self._writes_since_checkpoint = 0
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        """Checkpoint and truncate the write-ahead log, then close this thread's connection
+
+        Called at exit, and by a process that is about to fork: a SQLite
+        connection must not be used on both sides of fork(). The next call
+        on this thread opens a new connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        try:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as e:
+            print(f"Error checkpointing content store: {e}")
+        finally:
+            conn.close()
+
+    def _initialize(self, conn):
+        """Check the database, create tables and run the one-time migrations"""
+        status = conn.execute('PRAGMA quick_check').fetchone()[0]
+        if status != 'ok':
+            print(f"⚠️  Content database failed integrity check: {status}")
+        conn.executescript(SCHEMA)
+        self._create_search_table(conn)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            if version < 1 and self.legacy_json and self.legacy_json.exists():
+                with open(self.legacy_json, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO content ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [self._item_to_row(item) for item in legacy if 'id' in item]
+                )
+            if version < 2:
+                for content_id, media in conn.execute('SELECT id, media FROM content').fetchall():
+                    self._set_refs(conn, content_id, json.loads(media))
+            if version < 3:
+                for content_id, title, body in conn.execute('SELECT id, title, body FROM content').fetchall():
+                    self._index(conn, content_id, title, body)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _create_search_table(self, conn):
+        """Create the full-text table with the best tokenizer this SQLite has"""
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'content_search'").fetchone()
+        if row is None:
+            for tokenizer in SEARCH_TOKENIZERS:
+                try:
+                    conn.execute(SEARCH_SCHEMA.format(tokenizer))
+                    break
+                except sqlite3.OperationalError:
+                    continue
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'content_search'").fetchone()
+        self._trigram = 'trigram' in row[0]
+
+    @staticmethod
+    def _index(conn, content_id, title, body):
+        """(Re)index one item's title and body text"""
+        conn.execute('DELETE FROM content_search WHERE rowid = ?', (content_id,))
+        conn.execute('INSERT INTO content_search (rowid, title, body) VALUES (?, ?, ?)',
+                     (content_id, title or '', html_to_text(body)))
+
+    @staticmethod
+    def _set_refs(conn, content_id, media):
+        """Replace the upload references recorded for one item"""
+        conn.execute('DELETE FROM media_refs WHERE content_id = ?', (content_id,))
+        conn.executemany(
+            'INSERT OR IGNORE INTO media_refs (filename, content_id) VALUES (?, ?)',
+            [(name, content_id) for name in media_filenames(media)]
+        )
+
+    @staticmethod
+    def _unreferenced(conn, filenames):
+        """The subset of ``filenames`` no item references any more"""
+        return {name for name in filenames
+                if conn.execute('SELECT 1 FROM media_refs WHERE filename = ? LIMIT 1', (name,)).fetchone() is None}
+
+    @staticmethod
+    def _item_to_row(item):
+        """Convert a content dict into a row tuple"""
+        return (
+            item['id'],
+            item.get('title', ''),
+            item.get('body', ''),
+            item.get('tag', ''),
+            item.get('date', ''),
+            json.dumps(item.get('media', []), ensure_ascii=False),
+            item.get('created_at', ''),
+            item.get('updated_at'),
+        )
+
+    @timed('list')
+    def list(self):
+        """Return all content, newest first"""
+        rows = self._connect().execute(f'SELECT {COLUMNS} FROM content {FEED_ORDER}')
+        return [_row_to_item(row) for row in rows]
+
+    @timed('page')
+    def page(self, limit, cursor=None, tags=None):
+        """Return ``(items, next_cursor)`` for one page of the feed
+
+        Keyset pagination on the (created_at, id) index, so every page costs
+        the same however deep it is. ``tags`` restricts the page to those
+        tags. ``next_cursor`` is None on the last page.
+        """
+        clauses, params = [], []
+        if cursor:
+            clauses.append('(created_at, id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        if tags:
+            clauses.append(f"tag IN ({', '.join('?' * len(tags))})")
+            params.extend(tags)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        rows = self._connect().execute(
+            f'SELECT {COLUMNS} FROM content {where} {FEED_ORDER} LIMIT ?',
+            (*params, limit + 1)
+        ).fetchall()
+        items = [_row_to_item(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+        return items, next_cursor
+
+    @timed('get')
+    def get(self, content_id):
+        """Return one content item or None"""
+        row = self._connect().execute(
+            f'SELECT {COLUMNS} FROM content WHERE id = ?', (content_id,)
+        ).fetchone()
+        return _row_to_item(row) if row else None
+
+    @timed('create')
+    def create(self, data):
+        """Insert a new item with the next id and return it
+
+        Raises ValueError if ``data`` is malformed (see check_content_data).
+        """
+        check_content_data(data)
+        with self._transaction() as conn:
+            return self._create(conn, data)
+
+    @timed('update')
+    def update(self, content_id, data, released=None):
+        """Apply the editable fields present in ``data``; return the item or None
+
+        If ``released`` is a set, the names of uploads that lost their last
+        reference through this edit are added to it. Raises ValueError if
+        ``data`` is malformed (see check_content_data).
+        """
+        check_content_data(data)
+        dropped = set()
+        with self._transaction() as conn:
+            item = self._update(conn, content_id, data, dropped)
+            if released is not None:
+                released |= self._unreferenced(conn, dropped)
+        return item
+
+    @timed('delete')
+    def delete(self, content_id, released=None):
+        """Delete an item; return True if it existed
+
+        ``released`` works as in ``update``.
+        """
+        dropped = set()
+        with self._transaction() as conn:
+            existed = self._delete(conn, content_id, dropped)
+            if released is not None:
+                released |= self._unreferenced(conn, dropped)
+        return existed
+
+    @timed('batch')
+    def batch(self, operations, released=None):
+        """Apply a list of create/update/delete operations in one transaction
+
+        Operations are ``{"op": "create", "data": {...}}``,
+        ``{"op": "update", "id": n, "data": {...}}`` and
+        ``{"op": "delete", "id": n}``, applied in order. Returns one result
+        per operation: ``{"op", "id", "content"}`` for creates and updates,
+        ``{"op", "id", "deleted"}`` for deletes (False if it was already gone).
+
+        All or nothing: a malformed operation or an update of a missing item
+        raises BatchError and nothing is written. ``released`` works as in
+        ``update``, counting references left after the whole batch.
+        """
+        if not isinstance(operations, list) or not operations:
+            raise BatchError('operations must be a non-empty list')
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise BatchError(f'At most {MAX_BATCH_OPERATIONS} operations per batch')
+        for index, operation in enumerate(operations):
+            _check_operation(index, operation)
+
+        results = []
+        dropped = set()
+        with self._transaction() as conn:
+            for index, operation in enumerate(operations):
+                op = operation['op']
+                if op == 'create':
+                    item = self._create(conn, operation['data'])
+                    results.append({'op': op, 'id': item['id'], 'content': item})
+                elif op == 'update':
+                    item = self._update(conn, operation['id'], operation['data'], dropped)
+                    if item is None:
+                        raise BatchError('Content not found', index, status=404)
+                    results.append({'op': op, 'id': item['id'], 'content': item})
+                else:
+                    deleted = self._delete(conn, operation['id'], dropped)
+                    results.append({'op': op, 'id': operation['id'], 'deleted': deleted})
+            if released is not None:
+                released |= self._unreferenced(conn, dropped)
+        return results
+
+    def _create(self, conn, data):
+        """Insert one item inside an open transaction"""
+        item = {
+            'title': data.get('title', ''),
+            'body': data.get('body', ''),
+            'tag': data.get('tag', 'Story'),
+            'date': data.get('date', datetime.now().strftime('%B %Y')),
+            'media': data.get('media', []),
+            'created_at': datetime.now().isoformat()
+        }
+        cursor = conn.execute(
+            'INSERT INTO content (title, body, tag, date, media, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (item['title'], item['body'], item['tag'], item['date'],
+             json.dumps(item['media'], ensure_ascii=False), item['created_at'])
+        )
+        self._set_refs(conn, cursor.lastrowid, item['media'])
+        self._index(conn, cursor.lastrowid, item['title'], item['body'])
+        return {'id': cursor.lastrowid, **item}
+
+    def _update(self, conn, content_id, data, dropped):
+        """Update one item inside an open transaction; upload names it stops using go in ``dropped``"""
+        changes = {key: data[key] for key in EDITABLE_FIELDS if key in data}
+        media = changes.get('media')
+        if 'media' in changes:
+            changes['media'] = json.dumps(changes['media'], ensure_ascii=False)
+        changes['updated_at'] = datetime.now().isoformat()
+        assignments = ', '.join(f'{key} = ?' for key in changes)
+
+        cursor = conn.execute(
+            f'UPDATE content SET {assignments} WHERE id = ?',
+            (*changes.values(), content_id)
+        )
+        if cursor.rowcount == 0:
+            return None
+        if 'media' in changes:
+            before = self._referenced_by(conn, content_id)
+            self._set_refs(conn, content_id, media)
+            dropped |= before - media_filenames(media)
+        row = conn.execute(f'SELECT {COLUMNS} FROM content WHERE id = ?', (content_id,)).fetchone()
+        if 'title' in changes or 'body' in changes:
+            self._index(conn, content_id, row[1], row[2])
+        return _row_to_item(row)
+
+    def _delete(self, conn, content_id, dropped):
+        """Delete one item inside an open transaction; its upload names go in ``dropped``"""
+        cursor = conn.execute('DELETE FROM content WHERE id = ?', (content_id,))
+        dropped |= self._referenced_by(conn, content_id)
+        conn.execute('DELETE FROM media_refs WHERE content_id = ?', (content_id,))
+        conn.execute('DELETE FROM content_search WHERE rowid = ?', (content_id,))
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _referenced_by(conn, content_id):
+        """Names of the uploads one item references"""
+        rows = conn.execute('SELECT filename FROM media_refs WHERE content_id = ?', (content_id,))
+        return {row[0] for row in rows}
+
+    @timed('references')
+    def references(self, filename):
+        """Ids of the items whose media point at upload ``filename``"""
+        rows = self._connect().execute(
+            'SELECT content_id FROM media_refs WHERE filename = ? ORDER BY content_id', (filename,)
+        )
+        return [row[0] for row in rows]
+
+    @timed('unreferenced')
+    def unreferenced(self, filenames):
+        """The subset of upload ``filenames`` no item references"""
+        return self._unreferenced(self._connect(), filenames)
+
+    def _match_expression(self, query):
+        """FTS5 MATCH expression requiring every term of a free-text query
+
+        Terms are quoted, so FTS5 operators typed by a user are searched
+        for literally. Raises ValueError if no term is long enough.
+        """
+        terms = query.split()
+        if self._trigram:
+            terms = [term for term in terms if len(term) >= MIN_TRIGRAM_TERM]
+        if not terms:
+            raise ValueError(f"Search terms must be at least {MIN_TRIGRAM_TERM if self._trigram else 1} characters")
+        suffix = '' if self._trigram else '*'   # Word tokens: match prefixes as you type
+        return ' '.join('"{}"{}'.format(term.replace('"', '""'), suffix) for term in terms)
+
+    @timed('search')
+    def search(self, query, limit, offset=0):
+        """Return ``(items, next_offset)`` for one page of ranked search results
+
+        Items are ordered by bm25 relevance (title hits weigh more) and carry
+        a ``snippet`` of the matching body text, HTML-escaped with the hits
+        wrapped in <mark>. ``next_offset`` is None on the last page.
+        """
+        conn = self._connect()
+        match = self._match_expression(query)
+        rows = conn.execute(
+            f"""SELECT {', '.join('c.' + column for column in COLUMNS.split(', '))},
+                       snippet(content_search, 1, char(2), char(3), '…', ?)
+                FROM content_search JOIN content c ON c.id = content_search.rowid
+                WHERE content_search MATCH ?
+                ORDER BY bm25(content_search, ?, 1.0), c.id DESC
+                LIMIT ? OFFSET ?""",
+            (SNIPPET_TOKENS[self._trigram], match, SEARCH_TITLE_WEIGHT, limit + 1, offset)
+        ).fetchall()
+
+        items = []
+        for row in rows[:limit]:
+            item = _row_to_item(row)
+            item['snippet'] = html.escape(row[8]).replace('\x02', '<mark>').replace('\x03', '</mark>')
+            items.append(item)
+        return items, (offset + limit if len(rows) > limit else None)
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+MP4/MOV "faststart" rewriter and layout probe (pure Python, ISO-BMFF)
+Moves the moov atom ahead of mdat so playback can start after the first
+range request, and reports where moov, mdat and the first keyframe live
+
+Usage:
+    python faststart.py videos/            # rewrite every .mp4/.mov in place
+    python faststart.py --dry-run videos/  # only report what would change
+"""
+
+import os
+import sys
+import struct
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.m4v'}
+COPY_BUFFER_SIZE = 1024 * 1024
+POSTER_SECONDS = 1
+
+# Boxes whose payload is just more boxes, on the path from moov to the chunk offset tables
+CONTAINER_BOXES = {'moov', 'trak', 'mdia', 'minf', 'stbl', 'edts', 'dinf', 'mvex'}
+
+Box = namedtuple('Box', 'type offset size header_size')
+Plan = namedtuple('Plan', 'needs_rewrite order moov_bytes layout source_stat')
+
+
+class FaststartError(ValueError):
+    """The file is not an ISO-BMFF movie this tool can rewrite"""
+
+
+class Node:
+    """A box inside moov: either a container of child nodes or an opaque payload"""
+
+    def __init__(self, box_type, payload=None, children=None):
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+
+    def to_bytes(self):
+        """Serialize the box, recomputing container sizes"""
+        body = b''.join(child.to_bytes() for child in self.children) if self.children is not None else self.payload
+        return struct.pack('>I4s', 8 + len(body), self.type.encode('latin-1')) + body
+
+    def find(self, *path):
+        """Return the first descendant following box types in ``path``, or None"""
+        node = self
+        for box_type in path:
+            node = next((child for child in node.children or [] if child.type == box_type), None)
+            if node is None:
+                return None
+        return node
+
+    def walk(self):
+        """Yield this node and every descendant"""
+        yield self
+        for child in self.children or []:
+            yield from child.walk()
+
+
+def iter_boxes(f, start, end):
+    """Yield the top-level boxes between byte ``start`` and ``end`` of ``f``"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size or pos + size > end:
+            raise FaststartError(f"Corrupt box at offset {pos}")
+        yield Box(box_type.decode('latin-1'), pos, size, header_size)
+        pos += size
+
+
+def parse_nodes(data):
+    """Parse a run of boxes held in memory into Nodes"""
+    nodes, pos = [], 0
+    while pos + 8 <= len(data):
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header_size or pos + size > len(data):
+            raise FaststartError("Corrupt box inside moov")
+        box_type = box_type.decode('latin-1')
+        body = data[pos + header_size:pos + size]
+        if box_type in CONTAINER_BOXES:
+            nodes.append(Node(box_type, children=parse_nodes(body)))
+        else:
+            nodes.append(Node(box_type, payload=body))
+        pos += size
+    return nodes
+
+
+def _chunk_offsets(node):
+    """Return the offsets stored in an stco/co64 node"""
+    count = struct.unpack_from('>I', node.payload, 4)[0]
+    fmt = '>%dI' if node.type == 'stco' else '>%dQ'
+    return list(struct.unpack_from(fmt % count, node.payload, 8))
+
+
+def _set_chunk_offsets(node, offsets, box_type):
+    """Store ``offsets`` in ``node`` as an stco or co64 table"""
+    fmt = '>%dI' if box_type == 'stco' else '>%dQ'
+    node.type = box_type
+    node.payload = node.payload[:4] + struct.pack('>I', len(offsets)) + struct.pack(fmt % len(offsets), *offsets)
+
+
+def _first_keyframe(moov):
+    """Return (offset, size) of the first keyframe of the first video track, or None"""
+    for trak in moov.children:
+        if trak.type != 'trak':
+            continue
+        hdlr = trak.find('mdia', 'hdlr')
+        if hdlr is None or hdlr.payload[8:12] != b'vide':
+            continue
+        stbl = trak.find('mdia', 'minf', 'stbl')
+        if stbl is None:
+            return None
+        stsz, stsc = stbl.find('stsz'), stbl.find('stsc')
+        offsets_node = stbl.find('stco') or stbl.find('co64')
+        if stsz is None or stsc is None or offsets_node is None:
+            return None
+
+        stss = stbl.find('stss')
+        sample = struct.unpack_from('>I', stss.payload, 8)[0] if stss and len(stss.payload) >= 12 else 1
+
+        uniform_size, sample_count = struct.unpack_from('>II', stsz.payload, 4)
+        sizes = None if uniform_size else struct.unpack_from('>%dI' % sample_count, stsz.payload, 12)
+        size_of = (lambda n: uniform_size) if uniform_size else (lambda n: sizes[n - 1])
+
+        chunk_offsets = _chunk_offsets(offsets_node)
+        entry_count = struct.unpack_from('>I', stsc.payload, 4)[0]
+        entries = [struct.unpack_from('>III', stsc.payload, 8 + 12 * i) for i in range(entry_count)]
+
+        if not 1 <= sample <= sample_count:
+            return None
+
+        # Tables that disagree with each other mean there is no keyframe to report
+        first_sample_of_run = 1
+        for i, (first_chunk, per_chunk, _) in enumerate(entries):
+            next_chunk = entries[i + 1][0] if i + 1 < len(entries) else len(chunk_offsets) + 1
+            run_samples = (next_chunk - first_chunk) * per_chunk
+            if per_chunk and sample < first_sample_of_run + run_samples:
+                chunk = first_chunk + (sample - first_sample_of_run) // per_chunk
+                first_in_chunk = first_sample_of_run + (chunk - first_chunk) * per_chunk
+                if not 1 <= chunk <= len(chunk_offsets) or first_in_chunk < 1:
+                    return None
+                offset = chunk_offsets[chunk - 1] + sum(size_of(n) for n in range(first_in_chunk, sample))
+                return offset, size_of(sample)
+            first_sample_of_run += run_samples
+        return None
+    return None
+
+
+def plan_faststart(path, rewrite=True):
+    """Work out the faststart layout of ``path`` without writing anything
+
+    Only box headers and the moov atom are read. Returns a Plan whose
+    ``layout`` dict describes the file as it will be after the rewrite (or
+    as it already is, when ``needs_rewrite`` is False or ``rewrite`` is
+    False - then nothing is planned and the plan must not be applied).
+    """
+    path = Path(path)
+    source_stat = path.stat()
+    with open(path, 'rb') as f:
+        boxes = list(iter_boxes(f, 0, source_stat.st_size))
+        moov = next((b for b in boxes if b.type == 'moov'), None)
+        mdat = next((b for b in boxes if b.type == 'mdat'), None)
+        if moov is None or mdat is None:
+            raise FaststartError(f"{path.name} has no moov/mdat atoms")
+        f.seek(moov.offset + moov.header_size)
+        moov_node = Node('moov', children=parse_nodes(f.read(moov.size - moov.header_size)))
+
+    needs_rewrite = moov.offset > mdat.offset
+    tables = [node for node in moov_node.walk() if node.type in ('stco', 'co64')]
+    order = [b for b in boxes if b is not moov]
+    rewrite = rewrite and needs_rewrite
+
+    if rewrite:
+        order.insert(order.index(mdat), moov)
+        original = {table_id: _chunk_offsets(node) for table_id, node in enumerate(tables)}
+        use_co64 = False
+        while True:
+            for table_id, node in enumerate(tables):
+                # Sizes only depend on entry counts, so placeholders are enough here
+                _set_chunk_offsets(node, original[table_id], 'co64' if use_co64 or node.type == 'co64' else 'stco')
+            moov_size = len(moov_node.to_bytes())
+
+            # Old position -> shift for every box that moves
+            shifts, pos = [], 0
+            for box in order:
+                size = moov_size if box is moov else box.size
+                if box is not moov:
+                    shifts.append((box.offset, box.offset + box.size, pos - box.offset))
+                pos += size
+
+            def shifted(offset):
+                for start, end, delta in shifts:
+                    if start <= offset < end:
+                        return offset + delta
+                return offset
+
+            patched = {table_id: [shifted(o) for o in offsets] for table_id, offsets in original.items()}
+            overflow = any(max(offsets, default=0) > 0xFFFFFFFF for offsets in patched.values())
+            if overflow and not use_co64:
+                use_co64 = True
+                continue
+            for table_id, node in enumerate(tables):
+                _set_chunk_offsets(node, patched[table_id], node.type)
+            break
+
+    moov_bytes = moov_node.to_bytes()
+    layout, pos = {}, 0
+    for box in order if rewrite else boxes:
+        size = len(moov_bytes) if box is moov and rewrite else box.size
+        if box is moov:
+            layout.update(moov_offset=pos, moov_size=size)
+        elif box.type == 'mdat' and 'mdat_offset' not in layout:
+            layout.update(mdat_offset=pos, mdat_size=size)
+        pos += size
+    layout['faststart'] = layout['moov_offset'] < layout['mdat_offset']
+    keyframe = _first_keyframe(moov_node)
+    if keyframe:
+        layout.update(keyframe_offset=keyframe[0], keyframe_size=keyframe[1])
+
+    return Plan(needs_rewrite, order, moov_bytes, layout, source_stat)
+
+
+def apply_faststart(path, plan):
+    """Rewrite ``path`` according to ``plan``; returns False if it changed meanwhile
+
+    The new file is written next to the original and swapped in with an
+    atomic rename, so readers see either the old or the new layout.
+    """
+    if not plan.needs_rewrite:
+        return True
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.faststart.tmp")
+    try:
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for box in plan.order:
+                if box.type == 'moov':
+                    dst.write(plan.moov_bytes)
+                    continue
+                src.seek(box.offset)
+                remaining = box.size
+                while remaining > 0:
+                    block = src.read(min(COPY_BUFFER_SIZE, remaining))
+                    if not block:
+                        raise FaststartError(f"{path.name} was truncated while rewriting")
+                    dst.write(block)
+                    remaining -= len(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        current = path.stat()
+        if (current.st_size, current.st_mtime_ns) != (plan.source_stat.st_size, plan.source_stat.st_mtime_ns):
+            tmp_path.unlink()
+            return False
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+        return True
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def faststart(path):
+    """Move moov ahead of mdat in place if needed and return the layout dict"""
+    plan = plan_faststart(path)
+    apply_faststart(path, plan)
+    return plan.layout
+
+
+def extract_poster(video_path, poster_path, seconds=POSTER_SECONDS):
+    """Write a JPEG poster frame with ffmpeg; returns False if ffmpeg is unavailable or fails
+
+    Decoding video frames needs a codec, so this is the one step that is
+    not pure Python.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return False
+    poster_path = Path(poster_path)
+    # Written aside and renamed, so a half-written poster is never served
+    tmp_path = poster_path.with_name(f".{poster_path.stem}.tmp{poster_path.suffix}")
+    try:
+        for offset in (seconds, 0):
+            result = subprocess.run(
+                [ffmpeg, '-loglevel', 'error', '-y', '-ss', str(offset), '-i', str(video_path),
+                 '-frames:v', '1', '-vf', 'scale=1280:-2', '-q:v', '4', str(tmp_path)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60
+            )
+            if result.returncode == 0 and tmp_path.exists() and tmp_path.stat().st_size:
+                os.replace(tmp_path, poster_path)
+                return True
+        return False
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def poster_name(filename):
+    """Filename of the poster frame for video ``filename``"""
+    return f"{os.path.splitext(filename)[0]}__poster.jpg"
+
+
+def prepare_upload(path, filename):
+    """Rewrite a video upload for faststart before it is published
+
+    ``path`` is the upload's temporary file and ``filename`` the name it
+    was uploaded as. Rewriting before the file gets its /uploads/ name
+    means a stored upload never changes, so every server process serves
+    the same bytes and the layout recorded for it stays true. Files that
+    cannot be parsed are published as they are.
+    """
+    if Path(filename).suffix.lower() not in VIDEO_EXTENSIONS:
+        return
+    try:
+        faststart(path)
+    except (FaststartError, OSError, struct.error) as e:
+        print(f"Not rewriting {filename}: {e}")
+
+
+def _extract_poster(path, poster_path):
+    """Extract the poster for one upload (runs on the worker thread)"""
+    if not extract_poster(path, poster_path):
+        print(f"Could not extract a poster frame from {path.name}")
+
+
+class VideoPipeline:
+    """Single background thread that extracts poster frames for uploaded videos
+
+    The faststart rewrite happens before a video is stored (prepare_upload),
+    so ``submit`` only reads the layout of the stored file, which never
+    changes, and queues the poster; it returns the poster URL (when ffmpeg
+    is installed) straight away. ``wait`` lets a request for a poster being
+    extracted in this process block until it is written.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='video-poster')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, path, url_prefix):
+        """Queue the poster for an uploaded video and return the media entry fields"""
+        path = Path(path)
+        if path.suffix.lower() not in VIDEO_EXTENSIONS:
+            return None
+        info = {}
+        try:
+            info['layout'] = plan_faststart(path, rewrite=False).layout
+        except (FaststartError, OSError, struct.error) as e:
+            print(f"No layout for {path.name}: {e}")
+
+        poster_path = path.with_name(poster_name(path.name))
+        if poster_path.exists():
+            info['poster'] = f"{url_prefix}{poster_path.name}"
+            return info
+        if not shutil.which('ffmpeg'):
+            return info
+        info['poster'] = f"{url_prefix}{poster_path.name}"
+
+        future = self._executor.submit(_extract_poster, path, poster_path)
+        with self._lock:
+            self._pending[poster_path.name] = future
+        future.add_done_callback(lambda _: self._forget(poster_path.name, future))
+        return info
+
+    def wait(self, filename, timeout=120):
+        """Block until a poster being extracted as ``filename`` is written"""
+        with self._lock:
+            future = self._pending.get(filename)
+        if future is None:
+            return
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Error extracting poster {filename}: {e}")
+
+    def _forget(self, name, future):
+        """Drop a finished job from the pending table"""
+        with self._lock:
+            if self._pending.get(name) is future:
+                del self._pending[name]
+
+
+def main(argv):
+    """Batch-rewrite the videos or directories named on the command line"""
+    dry_run = '--dry-run' in argv
+    targets = [Path(arg) for arg in argv if arg != '--dry-run'] or [Path('videos')]
+
+    files = []
+    for target in targets:
+        if target.is_dir():
+            files.extend(sorted(p for p in target.rglob('*') if p.suffix.lower() in VIDEO_EXTENSIONS))
+        else:
+            files.append(target)
+
+    rewritten = 0
+    for video in files:
+        try:
+            plan = plan_faststart(video)
+        except (FaststartError, OSError, struct.error) as e:
+            print(f"⚠️  {video}: skipped ({e})")
+            continue
+        if not plan.needs_rewrite:
+            print(f"✅ {video}: already faststart")
+            continue
+        if not dry_run:
+            if not apply_faststart(video, plan):
+                print(f"⚠️  {video}: changed while rewriting, left as is")
+                continue
+        rewritten += 1
+        print(f"🚀 {video}: moov ({plan.layout['moov_size']} bytes) "
+              f"{'would move' if dry_run else 'moved'} ahead of mdat")
+
+    print(f"\n{rewritten} of {len(files)} file(s) {'need' if dry_run else 'got'} a faststart rewrite")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
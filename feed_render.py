@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Server-side rendering of the first page of content cards
+The helpers mirror createContentCard()/renderMedia() in js/content-loader.js
+so pre-rendered cards and cards added by infinite scroll look the same
+"""
+
+import os
+import re
+import json
+
+from markupsafe import Markup
+
+FEED_PAGE_SIZE = 12   # Keep in step with PAGE_SIZE in js/content-loader.js
+FEED_MARKER = '<!-- Dynamic content will be loaded here -->'
+FEED_STATE_ID = 'feedState'
+# A script element (or an unclosed one, which runs to the end of the document)
+SCRIPT_ELEMENT = re.compile(r'<script\b.*?(?:</script\s*>|$)', re.IGNORECASE | re.DOTALL)
+
+# (substring of the lowercased tag, badge classes) - first match wins
+TAG_CLASSES = [
+    ('family', 'bg-danger'),
+    ('note', 'bg-warning text-dark'),
+    ('story', 'bg-primary'),
+    ('update', 'bg-info'),
+]
+
+FILE_ICONS = {
+    'pdf': 'bi-file-pdf text-danger',
+    'doc': 'bi-file-word text-primary',
+    'docx': 'bi-file-word text-primary',
+    'txt': 'bi-file-text',
+    'zip': 'bi-file-zip text-warning',
+}
+
+
+def body_html(body):
+    """A post body as trusted markup, minus <script> elements
+
+    The browser path inserts bodies with innerHTML, which never runs
+    scripts; dropping them keeps server-rendered cards equally inert.
+    """
+    return Markup(SCRIPT_ELEMENT.sub('', body or ''))
+
+
+def tag_class(tag):
+    """Badge classes for a content tag"""
+    tag = (tag or '').lower()
+    return next((classes for key, classes in TAG_CLASSES if key in tag), 'bg-secondary')
+
+
+def file_icon(filename):
+    """Bootstrap icon classes for a downloadable file"""
+    return FILE_ICONS.get(os.path.splitext(filename or '')[1].lstrip('.').lower(), 'bi-file-earmark')
+
+
+def gallery_items(media):
+    """Images then videos, tagged with ``mediaType`` as openMediaGallery() expects"""
+    return ([{**m, 'mediaType': 'image'} for m in media if m.get('type') == 'image'] +
+            [{**m, 'mediaType': 'video'} for m in media if m.get('type') == 'video'])
+
+
+def smallest_image_url(media):
+    """Smallest available version of an image"""
+    variants = media.get('variants') or []
+    return variants[0]['url'] if variants else media.get('url', '')
+
+
+def responsive_image_attrs(media, sizes):
+    """srcset/sizes attributes for an image with width variants"""
+    variants = media.get('variants') or []
+    if not variants:
+        return Markup('')
+    candidates = [f"{v['url']} {v['width']}w" for v in variants]
+    if media.get('width'):
+        candidates.append(f"{media['url']} {media['width']}w")
+    return Markup('srcset="{}" sizes="{}"').format(', '.join(candidates), sizes)
+
+
+def video_attrs(media):
+    """preload/poster/prefetch attributes for a video"""
+    layout = media.get('layout')
+    preload = 'none' if layout and not layout.get('faststart') else 'metadata'
+    attrs = Markup('preload="{}"').format(preload)
+    if media.get('poster'):
+        attrs += Markup(' poster="{}"').format(media['poster'])
+    if layout and layout.get('faststart') and 'keyframe_offset' in layout:
+        attrs += Markup(' data-prefetch-end="{}"').format(layout['keyframe_offset'] + layout['keyframe_size'] - 1)
+    return attrs
+
+
+def feed_state(next_cursor):
+    """JSON the page script reads to continue the feed where the server stopped"""
+    state = json.dumps({'next_cursor': next_cursor, 'limit': FEED_PAGE_SIZE})
+    # Keep "</script>" and friends out of the inline script element
+    state = state.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+    return Markup(f'<script type="application/json" id="{FEED_STATE_ID}">{state}</script>')
+
+
+# Globals for templates/feed_cards.html
+FEED_HELPERS = {
+    'body_html': body_html,
+    'tag_class': tag_class,
+    'file_icon': file_icon,
+    'gallery_items': gallery_items,
+    'smallest_image_url': smallest_image_url,
+    'responsive_image_attrs': responsive_image_attrs,
+    'video_attrs': video_attrs,
+    'feed_state': feed_state,
+}
+
+
+def inject_feed(html, fragment):
+    """Put the rendered cards where the page expects dynamic content"""
+    return html.replace(FEED_MARKER, fragment, 1)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Open-descriptor and stat cache for files served by server.py and admin_server.py
+Hot files (a video being seeked, the site's css/js) are opened and stat'ed
+once, then answered from memory; each entry is re-checked with one stat()
+at most every REVALIDATE_INTERVAL seconds, so replaced or deleted files are
+picked up quickly without per-request syscalls
+"""
+
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+REVALIDATE_INTERVAL = float(os.getenv('FILE_CACHE_REVALIDATE', '1.0'))
+MAX_ENTRIES = int(os.getenv('FILE_CACHE_ENTRIES', '1024'))       # stat results, found or not
+MAX_OPEN_FILES = int(os.getenv('FILE_CACHE_OPEN_FILES', '128'))  # descriptors kept open
+
+
+def _same_file(a, b):
+    """True when two stat results describe the same unchanged file"""
+    return (a.st_ino, a.st_dev, a.st_mtime_ns, a.st_size) == (b.st_ino, b.st_dev, b.st_mtime_ns, b.st_size)
+
+
+class _Entry:
+    """What the cache knows about one path: its stat (None if missing) and maybe an open fd"""
+
+    __slots__ = ('st', 'fd', 'refs', 'checked', 'retired')
+
+    def __init__(self, st, checked, fd=None):
+        self.st = st
+        self.fd = fd
+        self.refs = 0
+        self.checked = checked
+        self.retired = False
+
+
+class CachedFile:
+    """Read-only file object over a cached descriptor, for one response
+
+    Reads are positional (os.pread) against this object's own position, so
+    any number of responses can share the descriptor. It works with
+    socket.sendfile(), shutil.copyfileobj() and WSGI file wrappers; close()
+    hands the descriptor back to the cache instead of closing it.
+    """
+
+    mode = 'rb'
+
+    def __init__(self, cache, entry, name):
+        self._cache = cache
+        self._entry = entry
+        self._pos = 0
+        self.name = name
+        self.closed = False
+
+    @property
+    def stat(self):
+        """stat result of the open file"""
+        return self._entry.st
+
+    def fileno(self):
+        return self._entry.fd
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._entry.st.st_size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(0, self._entry.st.st_size - self._pos)
+        data = os.pread(self._entry.fd, size, self._pos)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._cache._release(self._entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileCache:
+    """LRU of stat results and open descriptors, keyed by filesystem path
+
+    Bounded by MAX_ENTRIES paths and MAX_OPEN_FILES descriptors; entries
+    hold no file data (that stays in the kernel page cache), so the count
+    bounds memory too. A descriptor still in use by a response is only
+    closed once that response is done with it.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_open=MAX_OPEN_FILES,
+                 revalidate=REVALIDATE_INTERVAL):
+        self.max_entries = max_entries
+        self.max_open = max_open
+        self.revalidate = revalidate
+        self._entries = OrderedDict()
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def stat(self, path):
+        """os.stat(path), answered from the cache when fresh
+
+        Raises FileNotFoundError for missing paths, like os.stat.
+        """
+        path = os.fspath(path)
+        entry = self._fresh(path)
+        if entry is None:
+            try:
+                st = os.stat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                st = None
+            entry = self._store(path, st)
+        if entry.st is None:
+            raise FileNotFoundError(path)
+        return entry.st
+
+    def open(self, path):
+        """CachedFile for a regular file, or None when ``path`` is missing or not a file"""
+        path = os.fspath(path)
+        entry = self._fresh(path)
+        if entry is not None:
+            if entry.st is None or not stat.S_ISREG(entry.st.st_mode):
+                return None
+            with self._lock:
+                if entry.fd is not None and not entry.retired:
+                    entry.refs += 1
+                    return CachedFile(self, entry, path)
+
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+        except (FileNotFoundError, NotADirectoryError):
+            self._store(path, None)
+            return None
+        except IsADirectoryError:
+            self.stat(path)
+            return None
+        except PermissionError:
+            return None
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            os.close(fd)
+            self._store(path, st)
+            return None
+        entry = self._store(path, st, fd)
+        return CachedFile(self, entry, path)
+
+    def clear(self):
+        """Forget every entry (descriptors in use close when released)"""
+        with self._lock:
+            for entry in self._entries.values():
+                self._retire(entry)
+            self._entries.clear()
+
+    def _fresh(self, path):
+        """The entry for ``path`` if it was checked recently enough, else None
+
+        An expired entry whose file is unchanged is renewed in place, keeping
+        its descriptor.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            if now - entry.checked < self.revalidate:
+                self._entries.move_to_end(path)
+                return entry
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            st = None
+        with self._lock:
+            if (self._entries.get(path) is entry and st is not None and entry.st is not None
+                    and _same_file(st, entry.st)):
+                entry.checked = now
+                self._entries.move_to_end(path)
+                return entry
+        return None
+
+    def _store(self, path, st, fd=None):
+        """Record what was found at ``path``, replacing any older entry"""
+        entry = _Entry(st, time.monotonic(), fd)
+        if fd is not None:
+            entry.refs = 1
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._retire(old)
+            self._entries[path] = entry
+            if fd is not None:
+                self._open += 1
+            while len(self._entries) > self.max_entries:
+                _, oldest = self._entries.popitem(last=False)
+                self._retire(oldest)
+            if self._open > self.max_open:
+                self._close_idle()
+        return entry
+
+    def _close_idle(self):
+        """Close least recently used descriptors nobody is reading (lock held)"""
+        for entry in self._entries.values():
+            if self._open <= self.max_open:
+                break
+            if entry.fd is not None and entry.refs == 0:
+                os.close(entry.fd)
+                entry.fd = None
+                self._open -= 1
+
+    def _retire(self, entry):
+        """Drop an entry, closing its descriptor now or when its last reader is done (lock held)"""
+        entry.retired = True
+        if entry.fd is not None and entry.refs == 0:
+            os.close(entry.fd)
+            entry.fd = None
+            self._open -= 1
+
+    def _release(self, entry):
+        """A CachedFile is done with ``entry``"""
+        with self._lock:
+            entry.refs -= 1
+            if entry.retired and entry.refs == 0 and entry.fd is not None:
+                os.close(entry.fd)
+                entry.fd = None
+                self._open -= 1
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Production server settings for admin_server.py
+Runs the Flask app on gunicorn with several worker processes, each with a
+pool of threads, instead of Werkzeug's single-process development server
+
+Usage:
+    gunicorn -c gunicorn.conf.py            # the Dockerfile's CMD
+    kill -HUP <master pid>                  # graceful restart of the workers
+
+Everything the workers share lives on disk and is safe across processes:
+content.db is SQLite in WAL mode, the visit counter merges its increments
+under a file lock, uploads are published with atomic links and chunked
+uploads are re-hashed from disk when a chunk lands on another worker.
+The app is loaded once in the master before forking, so every worker gets
+the same secret key even when SECRET_KEY is not set.
+"""
+
+import os
+import shutil
+import multiprocessing
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Each worker publishes its /metrics values here so any worker can report the total
+METRICS_DIR = Path(os.getenv('METRICS_DIR', str(Path(__file__).parent / 'data' / 'metrics')))
+
+wsgi_app = 'admin_server:app'
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+
+# Threads keep long video streams and uploads from holding a whole process
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count())))
+threads = int(os.getenv('WEB_THREADS', '8'))
+preload_app = True
+
+# A worker that stops responding for this long is killed and replaced
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+# In-flight requests get this long to finish on restart or shutdown
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+
+# Recycle workers now and then (staggered) so slow leaks cannot build up
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = None        # Request counts and latencies are on /metrics
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Refresh .br/.gz copies of the site's text assets and sweep unused uploads once, before forking"""
+    from precompressed import precompress_tree
+    from admin_server import content_store, sweep_orphan_uploads
+    precompress_tree(Path(__file__).parent)
+    sweep_orphan_uploads()
+    # Workers must not inherit the master's SQLite connection
+    content_store.close()
+    # Metrics restart from zero with the server, like a single process
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def post_fork(server, worker):
+    """Share this worker's metrics with the others"""
+    from metrics import REGISTRY
+    REGISTRY.share(METRICS_DIR)
+
+
+def worker_exit(server, worker):
+    """Write out the worker's pending visits and final metrics before it goes"""
+    from admin_server import visit_counter
+    from metrics import REGISTRY
+    visit_counter.close()
+    REGISTRY.publish()
+
+
+def child_exit(server, worker):
+    """Keep the totals of a worker that exited (or was killed), minus its gauges"""
+    from metrics import REGISTRY
+    REGISTRY.archive(METRICS_DIR, worker.pid)
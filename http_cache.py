@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+HTTP caching helpers shared by server.py and admin_server.py
+Per-path Cache-Control policies and conditional GET (304) evaluation
+"""
+
+from fnmatch import fnmatchcase
+from email.utils import parsedate_to_datetime
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# Uploads are named by content hash and assets by fingerprint, so their bytes never change
+IMMUTABLE = f"public, max-age={ONE_YEAR}, immutable"
+# Must be revalidated (cheap 304) on every use so edits show up at once
+REVALIDATE = "no-cache"
+
+# Fingerprint inserted by asset_pipeline.py: style.3f2a9c1b7e.css
+FINGERPRINT = '[0-9a-f]' * 10
+
+# (path glob, Cache-Control) - first match wins
+CACHE_POLICIES = [
+    (f'/css/*.{FINGERPRINT}.css', IMMUTABLE),
+    (f'/js/*.{FINGERPRINT}.js', IMMUTABLE),
+    ('/uploads/*', IMMUTABLE),
+    ('/videos/*', "public, max-age=604800"),
+    ('*.html', REVALIDATE),
+    ('*/', REVALIDATE),
+]
+DEFAULT_CACHE_CONTROL = "public, max-age=0"
+
+
+def cache_control_for(url_path):
+    """Return the Cache-Control value for a request path (query string ignored)"""
+    path = url_path.split('?', 1)[0].split('#', 1)[0]
+    for pattern, policy in CACHE_POLICIES:
+        if fnmatchcase(path, pattern):
+            return policy
+    return DEFAULT_CACHE_CONTROL
+
+
+def _strip_weak(tag):
+    """Drop the W/ prefix so entity-tags compare weakly"""
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def is_not_modified(if_none_match, if_modified_since, etag, mtime):
+    """Return True if a GET/HEAD can be answered with 304 Not Modified
+
+    If-None-Match takes precedence and uses weak comparison, as RFC 7232
+    requires; If-Modified-Since is only consulted when it is absent.
+    """
+    if if_none_match:
+        if if_none_match.strip() == '*':
+            return True
+        current = _strip_weak(etag)
+        return any(_strip_weak(tag.strip()) == current for tag in if_none_match.split(','))
+
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+
+    return False
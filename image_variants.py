@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Responsive image variants for uploaded photos
+Downscaled copies at a few fixed widths are generated on a process pool
+after upload, so gallery tiles can use srcset instead of full-size originals
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it uploads keep originals only
+    Image = None
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_EXTENSIONS = {'.jpg', '.jpeg', '.png'}   # GIFs may be animated - leave them alone
+JPEG_QUALITY = 82
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# photo_20251220_123456_abc123__w640.jpg -> photo_20251220_123456_abc123.jpg
+VARIANT_NAME = re.compile(r'^(?P<stem>.+)__w(?P<width>\d+)(?P<ext>\.[A-Za-z0-9]+)$')
+
+
+def variant_name(filename, width):
+    """Filename of the ``width`` pixel variant of ``filename``"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}__w{width}{ext}"
+
+
+def original_for_variant(filename):
+    """Return the original filename a variant name was derived from, or None"""
+    match = VARIANT_NAME.match(filename)
+    if not match or int(match.group('width')) not in VARIANT_WIDTHS:
+        return None
+    return match.group('stem') + match.group('ext')
+
+
+def plan_variants(path):
+    """Return ``(width, height, widths)`` for an image without decoding its pixels
+
+    ``widths`` lists the variant widths smaller than the (EXIF-rotated)
+    original. Returns None if the file is not a readable image or Pillow
+    is missing.
+    """
+    if Image is None or Path(path).suffix.lower() not in VARIANT_EXTENSIONS:
+        return None
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            # EXIF orientations 5-8 are rotated by 90 degrees
+            if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                width, height = height, width
+    except (OSError, ValueError):
+        return None
+    return width, height, [w for w in VARIANT_WIDTHS if w < width]
+
+
+def render_variants(path, widths):
+    """Write the requested variants next to ``path`` (runs in a worker process)"""
+    path = Path(path)
+    with Image.open(path) as img:
+        largest = max(widths)
+        if img.format == 'JPEG':
+            # Let libjpeg decode at a reduced scale - much faster for phone photos
+            img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        is_jpeg = path.suffix.lower() in ('.jpg', '.jpeg')
+        if is_jpeg and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        for width in sorted(widths, reverse=True):
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            target = path.with_name(variant_name(path.name, width))
+            tmp = target.with_name(target.name + '.tmp')
+            if is_jpeg:
+                resized.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                resized.save(tmp, 'PNG', optimize=True)
+            os.replace(tmp, target)
+            img = resized  # Each smaller size is resampled from the previous one
+    return widths
+
+
+class VariantPipeline:
+    """Process pool that renders variants in the background
+
+    ``submit`` returns immediately with the variant list to record in the
+    media entry; ``wait`` lets a request for a variant that is still being
+    rendered block briefly instead of failing.
+    """
+
+    def __init__(self, workers=IMAGE_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        """Create the worker processes on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def submit(self, path, url_prefix):
+        """Queue variant rendering for an uploaded image
+
+        Returns a dict with the original ``width``/``height`` and a
+        ``variants`` list of ``{"width", "url"}``, or None when the file
+        gets no variants.
+        """
+        plan = plan_variants(path)
+        if plan is None:
+            return None
+        width, height, widths = plan
+        info = {'width': width, 'height': height, 'variants': []}
+        if not widths:
+            return info
+
+        path = Path(path)
+        info['variants'] = [{'width': w, 'url': f"{url_prefix}{variant_name(path.name, w)}"} for w in widths]
+        # A re-upload of stored bytes already has its variants
+        missing = [w for w in widths if not path.with_name(variant_name(path.name, w)).exists()]
+        if not missing:
+            return info
+
+        future = self._pool().submit(render_variants, str(path), missing)
+        with self._lock:
+            self._pending[path.name] = future
+        future.add_done_callback(lambda _: self._forget(path.name, future))
+        return info
+
+    def wait(self, original_name, timeout=10):
+        """Block until variants for ``original_name`` are written (if in progress)"""
+        with self._lock:
+            future = self._pending.get(original_name)
+        if future is None:
+            return
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Error rendering image variants for {original_name}: {e}")
+
+    def _forget(self, name, future):
+        """Drop a finished job from the pending table"""
+        with self._lock:
+            if self._pending.get(name) is future:
+                del self._pending[name]
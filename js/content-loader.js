@@ -19,39 +19,167 @@
         }
     }
 
-    // Load and display content on page load
+    // Count this visit and show the total in the footer
+    async function countVisit() {
+        try {
+            const response = await fetch('/api/visit/increment');
+            showVisitCount((await response.json()).visits);
+        } catch (error) {
+            console.error('Error updating visit count:', error);
+            showVisitCount(null);
+        }
+    }
+
+    function showVisitCount(visits) {
+        const el = document.getElementById('visitCount');
+        if (el) el.textContent = typeof visits === 'number' ? visits.toLocaleString() : '—';
+    }
+
+    // Feed pagination state
+    const PAGE_SIZE = 12;   // Same as FEED_PAGE_SIZE in feed_render.py
+    let nextCursor = null;
+    let isLoadingPage = false;
+    let pageObserver = null;
+    let pageSentinel = null;
+
+    // Auth state, visit count and (unless the page was pre-rendered) the first
+    // content page in one request. Returns null where /api/bootstrap does not
+    // exist (the static server.py), so callers fall back to the separate calls.
+    async function fetchBootstrap(withContent) {
+        const params = withContent ? feedParams(null) : new URLSearchParams({ content: '0' });
+        try {
+            const response = await fetch(`/api/bootstrap?${params}`);
+            if (!response.ok) return null;
+            return await response.json();
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // Load and display the first page of content on page load
     async function loadContent() {
         try {
-            await checkAdminStatus();
-            
-            const response = await fetch('/api/content');
-            const content = await response.json();
+            const container = document.getElementById('contentContainer');
+            // admin_server.py renders the first page into the HTML; only hydrate it
+            const prerendered = container && document.getElementById('feedState');
+            if (prerendered) {
+                hydratePrerenderedFeed(container, JSON.parse(prerendered.textContent));
+            }
             
-            if (content.length === 0) {
-                console.log('No dynamic content to display');
-                return;
+            const boot = await fetchBootstrap(container && !prerendered);
+            if (boot) {
+                isAdmin = boot.authenticated;
+                showVisitCount(boot.visits);
+            } else {
+                await Promise.all([checkAdminStatus(), countVisit()]);
             }
             
-            const container = document.getElementById('contentContainer');
             if (!container) {
                 console.error('Content container not found. Make sure element with id="contentContainer" exists.');
                 return;
             }
+            if (prerendered) {
+                if (isAdmin) addEditButtons(container);
+                return;
+            }
+            
+            const page = boot && boot.content ? boot.content : await fetchContentPage(null);
+            
+            if (page.items.length === 0) {
+                console.log('No dynamic content to display');
+                return;
+            }
             
             // Clear existing dynamic content
             container.innerHTML = '';
             
-            // Insert dynamic content
-            content.forEach(item => {
-                const card = createContentCard(item);
-                container.appendChild(card);
-            });
+            appendPage(container, page);
+            watchForMorePages(container);
             
         } catch (error) {
             console.error('Failed to load content:', error);
         }
     }
     
+    // Wire up server-rendered cards: players and further pages
+    function hydratePrerenderedFeed(container, state) {
+        nextCursor = state.next_cursor;
+        container.querySelectorAll('.inline-video-player[data-video-id]').forEach(player => {
+            initInlineVideoPlayer(player.dataset.videoId);
+        });
+        watchForMorePages(container);
+    }
+    
+    // Edit buttons on server-rendered cards, which are the same for every visitor
+    function addEditButtons(container) {
+        container.querySelectorAll('.masonry-item[data-content-id]').forEach(col => {
+            const actions = col.querySelector('.card-actions');
+            if (actions && !actions.querySelector('.edit-content-btn')) {
+                actions.prepend(createEditButton(col.dataset.contentId));
+            }
+        });
+    }
+    
+    // Query for one page of content (optionally filtered by ?tag= on the page URL)
+    function feedParams(cursor) {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (cursor) params.set('cursor', cursor);
+        new URLSearchParams(window.location.search).getAll('tag').forEach(tag => params.append('tag', tag));
+        return params;
+    }
+    
+    // Fetch one page of content
+    async function fetchContentPage(cursor) {
+        const response = await fetch(`/api/content?${feedParams(cursor)}`);
+        return response.json();
+    }
+    
+    function appendPage(container, page) {
+        page.items.forEach(item => {
+            const card = createContentCard(item);
+            container.appendChild(card);
+        });
+        nextCursor = page.next_cursor;
+    }
+    
+    // Fetch the next page when the user scrolls near the end of the feed
+    function watchForMorePages(container) {
+        if (!nextCursor || !('IntersectionObserver' in window)) return;
+        
+        pageSentinel = document.createElement('div');
+        pageSentinel.className = 'content-page-sentinel';
+        container.after(pageSentinel);
+        
+        pageObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage(container);
+            }
+        }, { rootMargin: '800px 0px' });
+        pageObserver.observe(pageSentinel);
+    }
+    
+    async function loadNextPage(container) {
+        if (isLoadingPage || !nextCursor) return;
+        isLoadingPage = true;
+        
+        try {
+            appendPage(container, await fetchContentPage(nextCursor));
+        } catch (error) {
+            console.error('Failed to load more content:', error);
+        } finally {
+            isLoadingPage = false;
+        }
+        
+        if (!nextCursor) {
+            pageObserver.disconnect();
+            pageSentinel.remove();
+        } else {
+            // Re-observe so a sentinel that is still on screen triggers another page
+            pageObserver.unobserve(pageSentinel);
+            pageObserver.observe(pageSentinel);
+        }
+    }
+    
     function createContentCard(item) {
         const tagClass = getTagClass(item.tag);
         const mediaHtml = item.media && item.media.length > 0 ? renderMedia(item.media) : '';
@@ -59,6 +187,7 @@
         // Create element programmatically to avoid XSS
         const col = document.createElement('div');
         col.className = 'masonry-item';
+        col.dataset.contentId = item.id;
         
         const card = document.createElement('div');
         card.className = 'card shadow-sm content-card';
@@ -75,20 +204,11 @@
         tagSpan.innerHTML = `<i class="bi bi-tag me-1"></i>${escapeHtml(item.tag)}`;
         
         const rightSide = document.createElement('div');
-        rightSide.className = 'd-flex align-items-center gap-2';
+        rightSide.className = 'd-flex align-items-center gap-2 card-actions';
         
         // Add edit button if admin
         if (isAdmin) {
-            const editBtn = document.createElement('a');
-            editBtn.href = `/admin#edit-${item.id}`;
-            editBtn.className = 'btn btn-sm btn-outline-primary';
-            editBtn.innerHTML = '<i class="bi bi-pencil"></i>';
-            editBtn.title = 'Edit content';
-            editBtn.onclick = (e) => {
-                e.preventDefault();
-                window.location.href = `/admin?edit=${item.id}`;
-            };
-            rightSide.appendChild(editBtn);
+            rightSide.appendChild(createEditButton(item.id));
         }
         
         const dateSpan = document.createElement('span');
@@ -125,6 +245,19 @@
         return col;
     }
     
+    function createEditButton(contentId) {
+        const editBtn = document.createElement('a');
+        editBtn.href = `/admin#edit-${contentId}`;
+        editBtn.className = 'btn btn-sm btn-outline-primary edit-content-btn';
+        editBtn.innerHTML = '<i class="bi bi-pencil"></i>';
+        editBtn.title = 'Edit content';
+        editBtn.onclick = (e) => {
+            e.preventDefault();
+            window.location.href = `/admin?edit=${contentId}`;
+        };
+        return editBtn;
+    }
+    
     function getTagClass(tag) {
         const tagLower = (tag || '').toLowerCase();
         if (tagLower.includes('family')) return 'bg-danger';
@@ -151,7 +284,7 @@
             html += `
                 <div class="inline-video-player" data-video-id="${videoId}">
                     <div class="video-container-inline">
-                        <video id="${videoId}" class="video-element-inline" preload="metadata">
+                        <video id="${videoId}" class="video-element-inline" ${videoAttrs(video)}>
                             <source src="${escapedUrl}" type="video/mp4">
                             Your browser does not support the video tag.
                         </video>
@@ -225,11 +358,13 @@
                 if (isVideo) {
                     html += `
                         <div class="video-preview-thumb">
-                            <video src="${escapedUrl}" muted preload="metadata"></video>
+                            <video src="${escapedUrl}" muted ${videoAttrs(item)}></video>
                             <div class="video-play-icon"><i class="bi bi-play-circle-fill"></i></div>
                         </div>`;
                 } else {
-                    html += `<img src="${escapedUrl}" alt="Preview" loading="lazy">`;
+                    // Tiles are half the card wide except for a single image
+                    const sizes = mediaItems.length === 1 ? '(max-width: 991px) 100vw, 620px' : '(max-width: 991px) 50vw, 310px';
+                    html += `<img src="${escapeHtml(smallestImageUrl(item))}" ${responsiveImageAttrs(item, sizes)} alt="Preview" loading="lazy">`;
                 }
                 
                 if (index === 3 && moreCount > 0) {
@@ -251,7 +386,7 @@
                 const escapedUrl = escapeHtml(file.url);
                 const escapedFilename = escapeHtml(file.filename);
                 html += `
-                    <a href="${escapedUrl}" class="list-group-item list-group-item-action" download>
+                    <a href="${escapedUrl}" class="list-group-item list-group-item-action" download="${escapedFilename}">
                         <i class="bi ${icon} me-2"></i>${escapedFilename}
                         <i class="bi bi-download float-end"></i>
                     </a>
@@ -264,6 +399,41 @@
         return html;
     }
     
+    // srcset/sizes attributes for an image with server-generated width variants
+    function responsiveImageAttrs(media, sizes) {
+        if (!media.variants || media.variants.length === 0) return '';
+        const candidates = media.variants.map(v => `${v.url} ${v.width}w`);
+        if (media.width) candidates.push(`${media.url} ${media.width}w`);
+        return `srcset="${escapeHtml(candidates.join(', '))}" sizes="${sizes}"`;
+    }
+    
+    // poster/preload attributes for a video. Uploads record where moov and the
+    // first keyframe live; files that still have moov at the end would cost
+    // several range probes just to show a thumbnail, so only load those on play.
+    function videoAttrs(media) {
+        const layout = media.layout;
+        let attrs = `preload="${layout && !layout.faststart ? 'none' : 'metadata'}"`;
+        if (media.poster) attrs += ` poster="${escapeHtml(media.poster)}"`;
+        if (layout && layout.faststart && layout.keyframe_offset !== undefined) {
+            attrs += ` data-prefetch-end="${layout.keyframe_offset + layout.keyframe_size - 1}"`;
+        }
+        return attrs;
+    }
+    
+    // Fetch moov and the first keyframe in one range request, ahead of play
+    function prefetchVideoStart(video) {
+        const end = video.dataset.prefetchEnd;
+        const source = video.currentSrc || video.querySelector('source')?.src;
+        if (!end || !source || video.dataset.prefetched) return;
+        video.dataset.prefetched = '1';
+        fetch(source, { headers: { Range: `bytes=0-${end}` } }).catch(() => {});
+    }
+    
+    // Smallest available version of an image, for thumbnails and srcset fallbacks
+    function smallestImageUrl(media) {
+        return media.variants && media.variants.length > 0 ? media.variants[0].url : media.url;
+    }
+    
     function getFileIcon(filename) {
         const ext = filename.split('.').pop().toLowerCase();
         const iconMap = {
@@ -327,7 +497,7 @@
                         <i class="bi bi-play-circle-fill"></i>
                     </div>`;
             } else {
-                thumb.innerHTML = `<img src="${escapeHtml(media.url)}" alt="Thumbnail">`;
+                thumb.innerHTML = `<img src="${escapeHtml(smallestImageUrl(media))}" alt="Thumbnail">`;
             }
             
             container.appendChild(thumb);
@@ -429,6 +599,9 @@
         const fullscreenBtn = document.getElementById(videoId + '-fullscreen');
         const container = video.closest('.video-container-inline');
         
+        // Warm the start of the file as soon as the pointer heads for play
+        container.addEventListener('pointerenter', () => prefetchVideoStart(video), { once: true });
+        
         // Format time
         function formatTime(seconds) {
             const mins = Math.floor(seconds / 60);
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Runtime metrics for server.py and admin_server.py in Prometheus text format
+Counters, gauges and histograms are written into lock-striped shards so
+request threads rarely contend; a scrape merges the shards. Under gunicorn
+every worker also publishes its values to a shared directory and a scrape
+adds them all up (see Registry.share)
+"""
+
+import bisect
+import functools
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STRIPES = 16
+SYNC_INTERVAL = 5   # Seconds between snapshots of a worker's values in the shared directory
+ARCHIVE_NAME = 'archive.json'   # Totals of workers that have exited
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STORE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+THROUGHPUT_BUCKETS = (1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 1e9)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    """Render {name="value",...} (empty string when there are no labels)"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format(value):
+    """Prometheus float formatting (+Inf, integers without .0)"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """Shared plumbing: a name, label names and STRIPES (lock, dict) shards"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._stripes = [(threading.Lock(), {}) for _ in range(STRIPES)]
+
+    def _stripe(self):
+        """This thread's shard - threads mostly land on different stripes"""
+        return self._stripes[threading.get_native_id() % STRIPES]
+
+    @staticmethod
+    def combine(a, b):
+        """Add two values of this metric"""
+        return a + b
+
+    @staticmethod
+    def empty():
+        return 0
+
+    def values(self):
+        """Merge every shard into one {labels: value} dict"""
+        merged = {}
+        for lock, shard in self._stripes:
+            with lock:
+                items = [(key, self.combine(self.empty(), value)) for key, value in shard.items()]
+            for key, value in items:
+                merged[key] = self.combine(merged.get(key, self.empty()), value)
+        return merged
+
+    def reset(self):
+        """Forget every value (a forked worker starts from zero)"""
+        for lock, shard in self._stripes:
+            with lock:
+                shard.clear()
+
+    def header(self):
+        """HELP/TYPE lines"""
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """Monotonic total per label set"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        lock, shard = self._stripe()
+        with lock:
+            shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self, values):
+        lines = self.header()
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_format(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """Value that goes up and down (sum of per-shard deltas)"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels):
+        """Count the block as in progress while it runs"""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    """Observations sorted into cumulative ``le`` buckets, plus _sum and _count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        lock, shard = self._stripe()
+        with lock:
+            entry = shard.get(labels)
+            if entry is None:
+                entry = shard[labels] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe how long the block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    @staticmethod
+    def combine(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def empty(self):
+        return [[0] * len(self.buckets), 0.0, 0]
+
+    def collect(self, values):
+        lines = self.header()
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", _format(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_format(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Registry:
+    """The set of metrics rendered by /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+        self._thread = None
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Text exposition of every registered metric (of every sharing process, see share())"""
+        if self.directory is None:
+            values = {metric.name: metric.values() for metric in self._metrics}
+        else:
+            self.publish()
+            values = self._gather()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect(values.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+    def share(self, directory, interval=SYNC_INTERVAL):
+        """Publish this process's values in ``directory`` and render everyone's
+
+        For servers with several worker processes: each one calls this after
+        forking, writes a snapshot every ``interval`` seconds (and right
+        before it renders), and a scrape landing on any worker sums the
+        snapshots of all of them plus the archived totals of exited workers.
+        Values inherited from the parent are dropped so they are not counted
+        once per worker.
+        """
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        for metric in self._metrics:
+            metric.reset()
+        self.publish()
+        self._thread = threading.Thread(target=self._sync, args=(interval,), name='metrics-sync', daemon=True)
+        self._thread.start()
+
+    def publish(self):
+        """Write this process's values to <directory>/<pid>.json"""
+        if self.directory is None:
+            return
+        snapshot = {metric.name: [[list(labels), value] for labels, value in metric.values().items()]
+                    for metric in self._metrics}
+        _write_json(os.path.join(self.directory, f'{os.getpid()}.json'), snapshot)
+
+    def archive(self, directory, pid):
+        """Fold the counters and histograms an exited process left in ``directory`` into the archive
+
+        Its gauges describe work that ended with it and are dropped. Call
+        from a single process (the gunicorn master).
+        """
+        path = os.path.join(directory, f'{pid}.json')
+        snapshot = _read_json(path)
+        if snapshot is None:
+            return
+        gauges = {metric.name for metric in self._metrics if metric.kind == 'gauge'}
+        snapshot = {name: entries for name, entries in snapshot.items() if name not in gauges}
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        totals = self._merge([_read_json(archive_path) or {}, snapshot])
+        _write_json(archive_path, {name: [[list(labels), value] for labels, value in values.items()]
+                                   for name, values in totals.items()})
+        os.unlink(path)
+
+    def _gather(self):
+        """Sum the snapshots in the shared directory"""
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                snapshot = _read_json(os.path.join(self.directory, name))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return self._merge(snapshots)
+
+    def _merge(self, snapshots):
+        """{metric name: {labels: value}} summed over snapshot dicts"""
+        metrics = {metric.name: metric for metric in self._metrics}
+        totals = {}
+        for snapshot in snapshots:
+            for name, entries in snapshot.items():
+                metric = metrics.get(name)
+                if metric is None:
+                    continue
+                values = totals.setdefault(name, {})
+                for labels, value in entries:
+                    labels = tuple(labels)
+                    values[labels] = metric.combine(values.get(labels, metric.empty()), value)
+        return totals
+
+    def _sync(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.publish()
+            except OSError as e:
+                print(f"Error publishing metrics: {e}")
+
+
+def _write_json(path, data):
+    """Replace ``path`` atomically, so readers never see half a snapshot"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    """Decoded ``path``, or None if it vanished or is unreadable"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'Requests served, by route and status code',
+    ('server', 'route', 'method', 'status')))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Time from request to last body byte, by route',
+    ('server', 'route')))
+HTTP_BYTES = REGISTRY.register(Counter(
+    'http_response_bytes_total', 'Response body bytes sent, by route',
+    ('server', 'route')))
+OPEN_STREAMS = REGISTRY.register(Gauge(
+    'http_open_streams', 'Response bodies currently being sent',
+    ('server',)))
+UPLOAD_BYTES = REGISTRY.register(Counter(
+    'upload_bytes_total', 'Upload bytes received',
+    ('kind',)))
+UPLOAD_THROUGHPUT = REGISTRY.register(Histogram(
+    'upload_throughput_bytes_per_second', 'Receive rate of each upload request',
+    ('kind',), buckets=THROUGHPUT_BUCKETS))
+STORE_DURATION = REGISTRY.register(Histogram(
+    'content_store_operation_seconds', 'Content store read and write timings',
+    ('operation',), buckets=STORE_BUCKETS))
+
+
+def authorized(authorization):
+    """True when METRICS_TOKEN is unset or ``authorization`` carries it as a Bearer token"""
+    token = os.getenv('METRICS_TOKEN')
+    return not token or hmac.compare_digest(authorization or '', f'Bearer {token}')
+
+
+def record_request(server, route, method, status, seconds, sent):
+    """Account one finished request"""
+    HTTP_REQUESTS.inc(server, route, method, str(status))
+    HTTP_DURATION.observe(seconds, server, route)
+    if sent:
+        HTTP_BYTES.inc(server, route, amount=sent)
+
+
+def record_upload(kind, received, seconds):
+    """Account one upload request body"""
+    UPLOAD_BYTES.inc(kind, amount=received)
+    if received and seconds > 0:
+        UPLOAD_THROUGHPUT.observe(received / seconds, kind)
+
+
+def timed(operation):
+    """Decorator recording a content store method in STORE_DURATION"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with STORE_DURATION.time(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
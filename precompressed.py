@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Precompressed static assets for server.py and admin_server.py
+Writes .br/.gz copies next to the site's text assets once, so each request
+only has to pick the variant the client accepts
+
+Usage:
+    python precompressed.py          # (re)build variants for index.html, css/ and js/
+"""
+
+import os
+import gzip
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; without it only .gz variants are written
+    brotli = None
+
+# Paths (relative to the site root) whose text assets get variants
+PRECOMPRESS_PATHS = ('index.html', 'css', 'js')
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.xml', '.map'}
+MIN_SIZE = 1024     # Below this the headers outweigh the savings
+
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _compress(encoding, data):
+    """Compress ``data`` as hard as the encoding allows - this runs once per asset"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, 9, mtime=0)
+
+
+def available_encodings():
+    """Encodings this installation can produce"""
+    return [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != 'br' or brotli is not None]
+
+
+def is_compressible(path):
+    """True for text assets that may have precompressed variants"""
+    return os.path.splitext(str(path))[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def precompress_file(path):
+    """Write fresh variants of one asset; returns the number of files written
+
+    Each variant gets the source's mtime, which is how a stale variant is
+    recognized (and ignored) after the source is edited. Variants that do
+    not come out smaller than the source are removed instead.
+    """
+    path = Path(path)
+    st = path.stat()
+    if st.st_size < MIN_SIZE:
+        for _, suffix in ENCODINGS:
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+        return 0
+
+    written = 0
+    data = None
+    for encoding, suffix in available_encodings():
+        target = path.with_name(path.name + suffix)
+        try:
+            if target.stat().st_mtime_ns == st.st_mtime_ns:
+                continue
+        except FileNotFoundError:
+            pass
+        if data is None:
+            data = path.read_bytes()
+        compressed = _compress(encoding, data)
+        if len(compressed) >= st.st_size:
+            target.unlink(missing_ok=True)
+            continue
+        tmp = target.with_name(target.name + '.tmp')
+        tmp.write_bytes(compressed)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, target)
+        written += 1
+    return written
+
+
+def precompress_tree(root, paths=PRECOMPRESS_PATHS):
+    """Build variants for every compressible asset under ``root``/``paths``"""
+    root = Path(root)
+    written = 0
+    for rel in paths:
+        target = root / rel
+        files = sorted(target.rglob('*')) if target.is_dir() else [target]
+        for path in files:
+            if path.is_file() and is_compressible(path):
+                try:
+                    written += precompress_file(path)
+                except OSError as e:
+                    print(f"Error precompressing {path}: {e}")
+    return written
+
+
+def accepted_encodings(header):
+    """Map each content-coding in an Accept-Encoding header to its q-value"""
+    weights = {}
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    return weights
+
+
+def _accepts(weights, encoding):
+    """True if ``encoding`` is acceptable, directly or through ``*``"""
+    return weights.get(encoding, weights.get('*', 0)) > 0
+
+
+def negotiate(path, st, accept_encoding, stat=os.stat):
+    """Pick a fresh precompressed variant of ``path`` for the client
+
+    ``st`` is the stat of the source; ``stat`` looks up the variants (a
+    FileCache's, to skip the syscalls). Returns ``(encoding, variant_path,
+    variant_stat)`` or None to serve the source as is.
+    """
+    if not is_compressible(path):
+        return None
+    weights = accepted_encodings(accept_encoding)
+    for encoding, suffix in ENCODINGS:
+        if not _accepts(weights, encoding):
+            continue
+        variant = f"{path}{suffix}"
+        try:
+            variant_st = stat(variant)
+        except FileNotFoundError:
+            continue
+        if variant_st.st_mtime_ns == st.st_mtime_ns:
+            return encoding, variant, variant_st
+    return None
+
+
+def encoded_etag(etag, encoding):
+    """ETag of an encoded representation, distinct from the identity one"""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+if __name__ == '__main__':
+    root = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('.')
+    count = precompress_tree(root)
+    kinds = ', '.join(encoding for encoding, _ in available_encodings())
+    print(f"✅ Wrote {count} precompressed file(s) ({kinds}) under {root.resolve()}")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pre-serialized response bodies for admin_server.py
+Holds the encoded bytes, a gzip copy and strong ETags for each, rebuilt
+only when the data they were built from changes
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+
+GZIP_LEVEL = 6
+
+Payload = namedtuple('Payload', 'body gzipped etag gzip_etag')
+
+
+def make_payload(body):
+    """Build a Payload from encoded response bytes"""
+    digest = hashlib.sha1(body).hexdigest()
+    return Payload(
+        body=body,
+        gzipped=gzip.compress(body, GZIP_LEVEL, mtime=0),
+        etag=f'"{digest}"',
+        gzip_etag=f'"{digest}-gz"',
+    )
+
+
+class VersionedCache:
+    """Cache of built values, each valid for one version token of its source
+
+    ``get(key, version, build)`` returns the cached value while ``version``
+    matches the one it was built for, and calls ``build()`` otherwise. Once
+    ``max_entries`` keys are held the oldest is evicted.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """Return the value for ``key`` at ``version``, building it if stale"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = build()
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (version, value)
+        return value
+
+    def clear(self):
+        """Drop every cached value"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Load-Test server.py and admin_server.py Locally
+
+Starts both servers on a throwaway copy of the site (your data/ and uploads/
+are never touched), runs a fixed set of workloads against them and prints
+throughput and latency percentiles as JSON, so runs on different commits
+can be compared.
+
+Workloads:
+1. downloads - concurrent full downloads of a large generated file
+2. seeks     - random-seek Range requests into the same file
+3. feed      - /api/content pages (first and deeper ones) and /index.html with N posts
+4. visits    - bursts of visit counter increments
+
+Usage:
+    python scripts/benchmark.py
+    python scripts/benchmark.py --posts 5000 --concurrency 32 --output bench.json
+    python scripts/benchmark.py --workloads seeks,feed --servers static
+
+Requirements:
+    The admin server's requirements (pip install -r requirements.txt);
+    the benchmark itself only uses the standard library.
+
+Every random choice comes from --seed and the generated file is the same
+for the same --file-mb, so two runs differ only in the code under test.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SITE_FILES = ('index.html', 'css', 'js', 'templates')
+BENCH_FILE = 'bench.bin'
+BENCH_TOKEN = 'benchmark-token'
+WORKLOADS = ('downloads', 'seeks', 'feed', 'visits')
+SERVERS = ('static', 'admin')
+FEED_PAGE_LIMIT = 20
+STARTUP_TIMEOUT = 30
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    """Ask the OS for an unused local port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare_site(workdir, file_mb, posts, seed):
+    """Copy the app into ``workdir``, write the large file and seed ``posts`` posts"""
+    for name in SITE_FILES:
+        source = REPO_DIR / name
+        if source.is_dir():
+            shutil.copytree(source, workdir / name)
+        elif source.exists():
+            shutil.copy2(source, workdir / name)
+    for source in REPO_DIR.glob('*.py'):
+        shutil.copy2(source, workdir / source.name)
+    (workdir / 'data').mkdir(exist_ok=True)
+
+    # Same bytes for the same size, whatever the seed
+    rng = random.Random(file_mb)
+    with open(workdir / BENCH_FILE, 'wb') as f:
+        for _ in range(file_mb):
+            f.write(rng.randbytes(1024 * 1024))
+
+    sys.path.insert(0, str(workdir))
+    try:
+        from content_store import ContentStore
+    finally:
+        sys.path.pop(0)
+    store = ContentStore(workdir / 'data' / 'content.db')
+    rng = random.Random(seed)
+    tags = ['Story', 'Family', 'Note', 'Update']
+    for i in range(posts):
+        words = ' '.join(rng.choice(['paak', 'poom', 'park', 'beach', 'school', 'birthday',
+                                     'holiday', 'garden', 'music', 'family']) for _ in range(60))
+        store.create({
+            'title': f'Benchmark post {i + 1}',
+            'body': f'<p>{words}</p>',
+            'tag': rng.choice(tags),
+            'date': 'January 2026',
+        })
+    store.close()
+
+
+def start_server(name, workdir, port):
+    """Start one server in ``workdir`` and wait until it accepts connections"""
+    env = dict(os.environ, API_TOKEN=BENCH_TOKEN, DEBUG='False', HOST='127.0.0.1', PORT=str(port),
+               ACCESS_LOG=str(workdir / 'logs' / 'access.log'), PYTHONUNBUFFERED='1')
+    command = [sys.executable, 'server.py', str(port)] if name == 'static' else [sys.executable, 'admin_server.py']
+    log = open(workdir / f'{name}.log', 'wb')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} server exited early - see {workdir / f'{name}.log'}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{name} server did not start within {STARTUP_TIMEOUT}s")
+
+
+class Client:
+    """One keep-alive connection per worker thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None):
+        """Send one request; return (status, body length)"""
+        for attempt in (1, 2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                size = 0
+                while True:
+                    chunk = response.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                if response.will_close:
+                    conn.close()
+                    self._local.conn = None
+                return response.status, size
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed an idle keep-alive connection - retry once on a new one
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+
+
+def run_workload(name, server, client, requests, concurrency, expected_status=(200, 206)):
+    """Send every request in ``requests`` (method, path, headers) and summarise the run"""
+    latencies = [None] * len(requests)
+    sizes = [0] * len(requests)
+    errors = []
+
+    def send(index):
+        method, path, headers = requests[index]
+        start = time.perf_counter()
+        try:
+            status, size = client.request(method, path, headers)
+        except OSError as e:
+            errors.append(str(e))
+            return
+        latencies[index] = time.perf_counter() - start
+        sizes[index] = size
+        if status not in expected_status:
+            errors.append(f'HTTP {status} for {path}')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(len(requests))))
+    elapsed = time.perf_counter() - started
+
+    done = sorted(latency for latency in latencies if latency is not None)
+    total_bytes = sum(sizes)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'workload': name,
+        'server': server,
+        'requests': len(requests),
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(done) / elapsed, 1) if elapsed else None,
+        'bytes': total_bytes,
+        'mb_per_second': round(total_bytes / elapsed / 1e6, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': ms(percentile(done, 0.50)),
+            'p95': ms(percentile(done, 0.95)),
+            'p99': ms(percentile(done, 0.99)),
+            'max': ms(done[-1] if done else None),
+            'mean': ms(sum(done) / len(done) if done else None),
+        },
+    }
+
+
+def feed_cursors(client, count):
+    """Walk the feed to collect up to ``count`` next_cursor values for deeper pages"""
+    cursors = []
+    cursor = None
+    conn = http.client.HTTPConnection('127.0.0.1', client.port, timeout=60)
+    try:
+        while len(cursors) < count:
+            query = {'limit': FEED_PAGE_LIMIT, **({'cursor': cursor} if cursor else {})}
+            conn.request('GET', f'/api/content?{urlencode(query)}')
+            page = json.loads(conn.getresponse().read())
+            cursor = page.get('next_cursor')
+            if not cursor:
+                break
+            cursors.append(cursor)
+    finally:
+        conn.close()
+    return cursors
+
+
+def build_requests(workload, server, args, rng, client):
+    """The request list for one workload, drawn from ``rng``"""
+    size = args.file_mb * 1024 * 1024
+    path = f'/{BENCH_FILE}'
+    if workload == 'downloads':
+        return [('GET', path, None)] * args.downloads
+    if workload == 'seeks':
+        window = args.seek_kb * 1024
+        requests = []
+        for _ in range(args.seeks):
+            start = rng.randrange(0, max(1, size - window))
+            requests.append(('GET', path, {'Range': f'bytes={start}-{start + window - 1}'}))
+        return requests
+    if workload == 'feed':
+        if server == 'static':
+            return None   # No content API
+        cursors = feed_cursors(client, 50)
+        requests = []
+        for _ in range(args.feed_requests):
+            choice = rng.random()
+            if choice < 0.4:
+                requests.append(('GET', f'/api/content?limit={FEED_PAGE_LIMIT}', None))
+            elif choice < 0.8 and cursors:
+                cursor = rng.choice(cursors)
+                requests.append(('GET', f'/api/content?{urlencode({"limit": FEED_PAGE_LIMIT, "cursor": cursor})}', None))
+            else:
+                requests.append(('GET', '/index.html', {'Accept-Encoding': 'gzip'}))
+        return requests
+    if workload == 'visits':
+        method = 'GET' if server == 'static' else 'POST'
+        return [(method, '/api/visit/increment', None)] * args.visits
+    raise ValueError(workload)
+
+
+def git_revision():
+    """Current commit of the repository under test, if it is a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark server.py and admin_server.py')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help='comma separated, from ' + ', '.join(WORKLOADS))
+    parser.add_argument('--servers', default=','.join(SERVERS), help='comma separated, from ' + ', '.join(SERVERS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--file-mb', type=int, default=64, help='size of the generated file')
+    parser.add_argument('--downloads', type=int, default=64, help='full downloads')
+    parser.add_argument('--seeks', type=int, default=2000, help='range requests')
+    parser.add_argument('--seek-kb', type=int, default=256, help='bytes per range request')
+    parser.add_argument('--posts', type=int, default=1000, help='posts in the content store')
+    parser.add_argument('--feed-requests', type=int, default=2000)
+    parser.add_argument('--visits', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=20, help='unmeasured requests before each workload')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary site directory')
+    args = parser.parse_args()
+
+    workloads = [w for w in args.workloads.split(',') if w]
+    servers = [s for s in args.servers.split(',') if s]
+    unknown = set(workloads) - set(WORKLOADS) | set(servers) - set(SERVERS)
+    if unknown:
+        parser.error(f"unknown workload/server: {', '.join(sorted(unknown))}")
+
+    workdir = Path(tempfile.mkdtemp(prefix='srisin-bench-'))
+    processes = []
+    results = []
+    try:
+        print(f"🛠️  Preparing {workdir} ({args.file_mb} MB file, {args.posts} posts)", file=sys.stderr)
+        prepare_site(workdir, args.file_mb, args.posts, args.seed)
+        clients = {}
+        for server in servers:
+            port = free_port()
+            processes.append(start_server(server, workdir, port))
+            clients[server] = Client(port)
+
+        for workload in workloads:
+            for server in servers:
+                rng = random.Random(f'{args.seed}-{workload}-{server}')
+                requests = build_requests(workload, server, args, rng, clients[server])
+                if requests is None:
+                    continue
+                if args.warmup:
+                    run_workload(workload, server, clients[server], requests[:args.warmup], args.concurrency)
+                print(f"⏱️  {workload} on {server} ({len(requests)} requests)", file=sys.stderr)
+                results.append(run_workload(workload, server, clients[server], requests, args.concurrency))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"📁 Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parameters': vars(args),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    if any(result['errors'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
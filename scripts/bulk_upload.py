@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Bulk Uploader: Upload a Whole Album Directory, Then Create Its Posts
+
+Walks a directory, uploads every supported file with a bounded pool of
+workers (each with its own keep-alive session) and, optionally, creates
+content entries from a manifest in one batch request afterwards.
+
+- Every file goes through the resumable chunked upload API. Its start
+  request carries the file's hash, and the server answers it straight
+  away for bytes it already has, so those files are skipped without
+  sending them (re-running after an interruption only uploads what is
+  missing)
+- Failed requests are retried with exponential backoff
+
+Usage:
+    export API_TOKEN="your-secret-token"
+    python scripts/bulk_upload.py ~/Pictures/album
+    python scripts/bulk_upload.py ~/Pictures/album --manifest album.json --workers 8
+
+Manifest (paths and glob patterns relative to the album directory):
+    {"posts": [
+        {"title": "Beach day", "body": "<p>...</p>", "tag": "Family",
+         "date": "July 2025", "files": ["2025-07-beach/*.jpg", "2025-07-beach/clip.mp4"]}
+    ]}
+
+The upload results (file -> media entry) are written to
+<album>/uploaded.json, so a manifest can also be applied later on its own
+with --skip-upload.
+
+Use it from Python:
+    from bulk_upload import BulkUploader
+    uploader = BulkUploader("http://localhost:5000", token, workers=4)
+    media = uploader.upload_all(uploader.find_files(album_dir))
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from fnmatch import fnmatchcase
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000")
+API_TOKEN = os.getenv("API_TOKEN")
+
+# Same limits as admin_server.py / templates/admin.html
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi', 'pdf', 'doc', 'docx', 'txt', 'zip'}
+MAX_BATCH_OPERATIONS = 1000
+
+DEFAULT_WORKERS = 4
+RETRIES = 5
+BACKOFF = 0.5            # Seconds before the first retry, doubled each time (plus jitter)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TIMEOUT = (10, 300)      # (connect, read) seconds
+HASH_BUFFER = 1024 * 1024
+RESULTS_NAME = 'uploaded.json'
+
+# Fields of an upload response that belong in a content item's media entry
+MEDIA_FIELDS = ('url', 'type', 'filename', 'width', 'height', 'variants', 'layout', 'poster')
+
+
+class UploadFailed(Exception):
+    """A file could not be uploaded after all retries"""
+
+
+def sha256_file(path):
+    """Hex SHA-256 of a file, read in pieces"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BUFFER), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def media_entry(info):
+    """The media entry to store in a post for an upload response (as the admin panel does)"""
+    entry = {key: info[key] for key in MEDIA_FIELDS if info.get(key) is not None}
+    # Visitors see (and download as) the name the file was uploaded as, not its hash
+    if info.get('original_filename'):
+        entry['filename'] = info['original_filename']
+    return entry
+
+
+def _size(n):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Progress:
+    """Thread-safe running totals printed as one line per finished file"""
+
+    def __init__(self, files, total_bytes):
+        self.files = files
+        self.total_bytes = total_bytes
+        self.done = 0
+        self.done_bytes = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def finished(self, path, size, status):
+        with self._lock:
+            self.done += 1
+            self.done_bytes += size
+            if status == 'skipped':
+                self.skipped += 1
+            elif status == 'failed':
+                self.failed += 1
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            icon = {'uploaded': '✅', 'skipped': '⏭️ ', 'failed': '❌'}[status]
+            print(f"{icon} [{self.done}/{self.files}] {_size(self.done_bytes)}/{_size(self.total_bytes)} "
+                  f"({_size(self.done_bytes / elapsed)}/s) {path}", flush=True)
+
+
+class BulkUploader:
+    """Uploads files to the content API with a bounded worker pool"""
+
+    def __init__(self, base_url, token, workers=DEFAULT_WORKERS, retries=RETRIES, backoff=BACKOFF):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.backoff = backoff
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """This thread's keep-alive session"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['Authorization'] = f'Bearer {self.token}'
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            self._local.session = session
+        return session
+
+    @staticmethod
+    def find_files(directory):
+        """Supported files under ``directory``, in a stable order"""
+        directory = Path(directory)
+        return sorted(p for p in directory.rglob('*')
+                      if p.is_file() and p.suffix.lstrip('.').lower() in ALLOWED_EXTENSIONS
+                      and p.name != RESULTS_NAME)
+
+    def _request(self, method, path, **kwargs):
+        """One API call, retried with backoff on connection errors and 429/5xx
+
+        Returns the response for any other status.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=TIMEOUT, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt == self.retries:
+                raise UploadFailed(f"{method} {path}: {error}")
+            time.sleep(self.backoff * 2 ** attempt * (1 + random.random() / 2))
+
+    @staticmethod
+    def _json(response, what):
+        """Decoded JSON body of a successful call, or UploadFailed"""
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if not response.ok or not data.get('success', False):
+            raise UploadFailed(f"{what}: {data.get('message') or f'HTTP {response.status_code}'}")
+        return data
+
+    def upload(self, path):
+        """Upload one file in chunks, resuming from the server's offset after errors
+
+        Returns the server's upload response. The start request sends the
+        file's SHA-256, so a file the server already stores costs one small
+        request and no body bytes.
+        """
+        path = Path(path)
+        digest = sha256_file(path)
+        size = path.stat().st_size
+        response = self._request('POST', '/api/upload/chunked',
+                                 json={'filename': path.name, 'size': size, 'sha256': digest})
+        start = self._json(response, path.name)
+        if 'upload_id' not in start:
+            return start   # Already stored - the normal upload response
+        upload_id, offset, chunk_size = start['upload_id'], start['offset'], start['chunk_size']
+
+        with open(path, 'rb') as f:
+            failures = 0
+            while offset < size:
+                f.seek(offset)
+                chunk = f.read(chunk_size)
+                response = self._request('PUT', f'/api/upload/chunked/{upload_id}?offset={offset}', data=chunk)
+                if response.ok:
+                    offset = response.json()['offset']
+                    failures = 0
+                    continue
+                failures += 1
+                if response.status_code != 409 or failures > self.retries:
+                    self._json(response, path.name)
+                # Offset mismatch (a retried chunk had landed) - continue from the server's count
+                offset = response.json().get('offset', offset)
+
+        response = self._request('POST', f'/api/upload/chunked/{upload_id}/finalize', json={'sha256': digest})
+        return self._json(response, path.name)
+
+    def upload_all(self, paths, root=None, progress=True):
+        """Upload ``paths`` with the worker pool
+
+        Returns ``({relative path: upload response}, {relative path: error})``;
+        paths are relative to ``root`` when given.
+        """
+        paths = [Path(p) for p in paths]
+        sizes = {p: p.stat().st_size for p in paths}
+        tracker = Progress(len(paths), sum(sizes.values())) if progress else None
+        uploaded, failed = {}, {}
+
+        def name(p):
+            return p.relative_to(root).as_posix() if root else str(p)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.upload, p): p for p in paths}
+            for future in as_completed(futures):
+                p = futures[future]
+                try:
+                    info = future.result()
+                except (UploadFailed, OSError) as e:
+                    failed[name(p)] = str(e)
+                    status = 'failed'
+                else:
+                    uploaded[name(p)] = info
+                    status = 'skipped' if info.get('duplicate') else 'uploaded'
+                if tracker:
+                    tracker.finished(name(p), sizes[p], status)
+        return uploaded, failed
+
+    def create_posts(self, posts):
+        """Create posts through the batch API; return the created items"""
+        created = []
+        for first in range(0, len(posts), MAX_BATCH_OPERATIONS):
+            operations = [{'op': 'create', 'data': post} for post in posts[first:first + MAX_BATCH_OPERATIONS]]
+            response = self._request('POST', '/api/content/batch', json={'operations': operations})
+            created.extend(result['content'] for result in self._json(response, 'Creating posts')['results'])
+        return created
+
+
+def posts_from_manifest(manifest, uploaded):
+    """Content items for the manifest's posts, with ``files`` turned into media entries
+
+    Raises ValueError naming any pattern that matches no uploaded file.
+    """
+    names = sorted(uploaded)
+    posts = []
+    for post in manifest.get('posts', []):
+        media = []
+        for pattern in post.get('files', []):
+            matches = [n for n in names if fnmatchcase(n, pattern)]
+            if not matches:
+                raise ValueError(f"No uploaded file matches {pattern!r} (post {post.get('title')!r})")
+            media.extend(media_entry(uploaded[n]) for n in matches)
+        item = {key: value for key, value in post.items() if key != 'files'}
+        item['media'] = list(post.get('media', [])) + media
+        posts.append(item)
+    return posts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upload an album directory and create its posts')
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('--manifest', type=Path, help='JSON file describing the posts to create')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='concurrent uploads')
+    parser.add_argument('--retries', type=int, default=RETRIES)
+    parser.add_argument('--skip-upload', action='store_true',
+                        help=f'use the results saved in {RESULTS_NAME} instead of uploading')
+    args = parser.parse_args()
+
+    if not API_TOKEN:
+        print("❌ Error: API_TOKEN environment variable not set!")
+        print("   Set it with: export API_TOKEN='your-secret-token'")
+        sys.exit(1)
+    if not args.directory.is_dir():
+        print(f"❌ Error: {args.directory} is not a directory")
+        sys.exit(1)
+
+    uploader = BulkUploader(BASE_URL, API_TOKEN, workers=args.workers, retries=args.retries)
+    results_path = args.directory / RESULTS_NAME
+    uploaded = json.loads(results_path.read_text(encoding='utf-8')) if results_path.exists() else {}
+
+    if not args.skip_upload:
+        files = uploader.find_files(args.directory)
+        print(f"📤 Uploading {len(files)} file(s) from {args.directory} to {BASE_URL} "
+              f"with {uploader.workers} worker(s)\n")
+        started = time.monotonic()
+        new, failed = uploader.upload_all(files, root=args.directory)
+        uploaded.update(new)
+        results_path.write_text(json.dumps(uploaded, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n✨ {len(new)} file(s) done in {time.monotonic() - started:.1f}s, {len(failed)} failed "
+              f"- results in {results_path}")
+        for name, error in sorted(failed.items()):
+            print(f"   ❌ {name}: {error}")
+        if failed:
+            print("   Run the same command again to retry them (finished files are skipped)")
+            sys.exit(1)
+
+    if args.manifest:
+        manifest = json.loads(args.manifest.read_text(encoding='utf-8'))
+        try:
+            posts = posts_from_manifest(manifest, uploaded)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        created = uploader.create_posts(posts)
+        print(f"\n📝 Created {len(created)} post(s)")
+        for item in created:
+            print(f"   #{item['id']} {item['title']} ({len(item['media'])} media)")
+
+
+if __name__ == '__main__':
+    main()
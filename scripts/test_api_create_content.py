@@ -28,6 +28,7 @@ The script will:
 import os
 import sys
 import json
+import hashlib
 import requests
 from pathlib import Path
 from io import BytesIO
@@ -100,18 +101,20 @@ def create_test_video():
 def upload_file(filename, file_bytes, file_type="image"):
     """Upload a file via the API"""
     files = {'file': (filename, file_bytes, f'{file_type}/png' if file_type == 'image' else 'video/mp4')}
+    # Lets the server answer without the body if it already stores these bytes
+    headers = {**AUTH_HEADERS, "X-Content-SHA256": hashlib.sha256(file_bytes.getvalue()).hexdigest()}
     
     print(f"📤 Uploading {filename}...")
     response = requests.post(
         f"{BASE_URL}/api/upload",
-        headers=AUTH_HEADERS,
+        headers=headers,
         files=files
     )
     
     if response.status_code == 200:
         data = response.json()
         if data.get('success'):
-            print(f"   ✅ Uploaded: {data['url']}")
+            print(f"   ✅ {'Already stored' if data.get('duplicate') else 'Uploaded'}: {data['url']}")
             return data
         else:
             print(f"   ❌ Upload failed: {data.get('message', 'Unknown error')}")
@@ -213,7 +216,7 @@ def main():
             media=[{
                 "url": image_data['url'],
                 "type": image_data['type'],
-                "filename": image_data['filename']
+                "filename": image_data.get('original_filename', image_data['filename'])
             }]
         )
         if text_image_id:
@@ -252,12 +255,12 @@ def main():
                 {
                     "url": image_data2['url'],
                     "type": image_data2['type'],
-                    "filename": image_data2['filename']
+                    "filename": image_data2.get('original_filename', image_data2['filename'])
                 },
                 {
                     "url": video_data['url'],
                     "type": video_data['type'],
-                    "filename": video_data['filename']
+                    "filename": video_data.get('original_filename', video_data['filename'])
                 }
             ]
         )
@@ -281,7 +284,7 @@ def main():
             media=[{
                 "url": video_data2['url'],
                 "type": video_data2['type'],
-                "filename": video_data2['filename']
+                "filename": video_data2.get('original_filename', video_data2['filename'])
             }]
         )
         if video_only_id:
@@ -5,49 +5,136 @@ This allows video seeking/scrubbing to work properly
 """
 
 import os
-import re
 import json
 import http.server
+import signal
+import stat
 import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from urllib.parse import urlsplit
+
+from byte_ranges import (RangeNotSatisfiable, entity_tag, http_date, if_range_allows,
+                         parse_range_header, plan_range_response)
+from http_cache import cache_control_for, is_not_modified
+from precompressed import encoded_etag, is_compressible, negotiate, precompress_tree
+from visit_counter import VisitCounter
+from access_log import AccessLog
+from file_cache import FileCache
+import metrics
 
 # Visit counter file
 VISIT_COUNTER_FILE = "data/visit_counter.json"
 
+# Concurrency limits (override with environment variables)
+DEFAULT_WORKERS = int(os.getenv('SERVER_WORKERS', '32'))
+DEFAULT_BACKLOG = int(os.getenv('SERVER_BACKLOG', '128'))
+DEFAULT_IDLE_TIMEOUT = float(os.getenv('SERVER_IDLE_TIMEOUT', '30'))
+
+# Counted in memory, written to disk in batches
+visit_counter = VisitCounter(VISIT_COUNTER_FILE)
+
+# Open descriptors and stat results of hot files (re-checked every second)
+file_cache = FileCache()
+
+# JSON-lines access log, written in batches by a background thread
+# (set ACCESS_LOG= to keep the plain per-request lines on stderr instead)
+ACCESS_LOG_FILE = os.getenv('ACCESS_LOG', 'logs/access.log')
+access_log = AccessLog(ACCESS_LOG_FILE) if ACCESS_LOG_FILE else None
+
+# Top-level directories of the served tree that are never sent to clients
+PRIVATE_DIRS = {'data', 'logs'}
+
 def load_visit_count():
-    """Load visit count from file"""
-    try:
-        if os.path.exists(VISIT_COUNTER_FILE):
-            with open(VISIT_COUNTER_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('count', 0)
-    except Exception as e:
-        print(f"Error loading visit count: {e}")
-    return 0
-
-def save_visit_count(count):
-    """Save visit count to file"""
-    try:
-        os.makedirs(os.path.dirname(VISIT_COUNTER_FILE), exist_ok=True)
-        with open(VISIT_COUNTER_FILE, 'w') as f:
-            json.dump({
-                'count': count,
-                'last_updated': datetime.now().isoformat()
-            }, f)
-    except Exception as e:
-        print(f"Error saving visit count: {e}")
+    """Return the current visit count"""
+    return visit_counter.count
 
 def increment_visit_count():
     """Increment and return visit count"""
-    count = load_visit_count()
-    count += 1
-    save_visit_count(count)
-    return count
+    return visit_counter.increment()
+
+# Paths reported as their own route in /metrics; files are grouped by top-level directory
+METRICS_ROUTES = {'/api/visit', '/api/visit/increment', '/metrics'}
+
+def metrics_route(request_path):
+    """Low-cardinality route label for a request path"""
+    path = urlsplit(request_path).path
+    if path in METRICS_ROUTES:
+        return path
+    top, sep, _ = path.lstrip('/').partition('/')
+    return f"/{top}/*" if sep else "/*"
+
 
 class RangeHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """HTTP request handler with support for Range requests (needed for video seeking)"""
     
+    # Body promised by send_head: literal bytes and (offset, length) file
+    # windows, or None when SimpleHTTPRequestHandler produced the response
+    send_segments = None
+    
+    def handle_one_request(self):
+        """Serve one request and record it in the metrics and access log"""
+        self.response_status = None
+        self.bytes_sent = 0
+        self.body_ranges = None
+        self.body_size = None
+        self.body_length = None
+        self.body_encoding = None
+        self.client_aborted = False
+        started = time.perf_counter()
+        try:
+            super().handle_one_request()
+        finally:
+            if self.response_status is not None:
+                duration = time.perf_counter() - started
+                # path/headers are missing when the request line could not be parsed
+                self.path = getattr(self, 'path', '')
+                metrics.record_request('static', metrics_route(self.path), self.command or '-',
+                                       self.response_status, duration, self.bytes_sent)
+                if access_log:
+                    access_log.write(self.access_record(duration))
+    
+    def access_record(self, duration):
+        """Access log entry for the request just served"""
+        aborted = self.client_aborted or (
+            self.body_length is not None and self.command != 'HEAD' and self.bytes_sent < self.body_length)
+        return {
+            'ts': round(time.time(), 3),
+            'client': self.client_address[0],
+            'method': self.command,
+            'path': urlsplit(self.path).path,
+            'status': self.response_status,
+            'ranges': self.body_ranges,
+            'size': self.body_size,
+            'encoding': self.body_encoding,
+            'bytes_sent': self.bytes_sent,
+            'duration_ms': round(duration * 1000, 2),
+            'aborted': aborted,
+            'user_agent': self.headers.get('User-Agent') if getattr(self, 'headers', None) else None,
+        }
+    
+    def log_request(self, code='-', size='-'):
+        """Per-request stderr line, only when the structured access log is off"""
+        if not access_log:
+            super().log_request(code, size)
+    
+    def send_response(self, code, message=None):
+        """Remember the status for the metrics"""
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def send_body(self, body, content_type):
+        """Write a small in-memory response body"""
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+        self.bytes_sent += len(body)
+    
     def do_GET(self):
         """Handle GET requests with visit counter API"""
         # API endpoint for visit counter
@@ -57,8 +144,9 @@ class RangeHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             count = load_visit_count()
-            response = json.dumps({'visits': count})
-            self.wfile.write(response.encode())
+            response = json.dumps({'visits': count}).encode()
+            self.wfile.write(response)
+            self.bytes_sent += len(response)
             return
         
         # API endpoint to increment visit counter
@@ -68,8 +156,17 @@ class RangeHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             count = increment_visit_count()
-            response = json.dumps({'visits': count})
-            self.wfile.write(response.encode())
+            response = json.dumps({'visits': count}).encode()
+            self.wfile.write(response)
+            self.bytes_sent += len(response)
+            return
+        
+        # Prometheus scrape target (Bearer METRICS_TOKEN when that is set)
+        elif self.path == '/metrics':
+            if not metrics.authorized(self.headers.get('Authorization')):
+                self.send_error(401, "Unauthorized")
+                return
+            self.send_body(metrics.REGISTRY.render().encode(), metrics.CONTENT_TYPE)
             return
         
         # Default file serving
@@ -77,10 +174,24 @@ class RangeHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     
     def send_head(self):
         """Common code for GET and HEAD commands with Range support"""
+        self.send_segments = None
         path = self.translate_path(self.path)
+        if os.path.relpath(path, self.directory).split(os.sep, 1)[0] in PRIVATE_DIRS:
+            self.send_error(404, "File not found")
+            return None
         
-        # Handle directory requests
-        if os.path.isdir(path):
+        # Hot files come from the descriptor cache without touching the disk
+        f = file_cache.open(path)
+        if f is None:
+            try:
+                is_dir = stat.S_ISDIR(file_cache.stat(path).st_mode)
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                # Missing - the stock handler sends the 404
+                return http.server.SimpleHTTPRequestHandler.send_head(self)
+            
+            # Handle directory requests
             if not self.path.endswith('/'):
                 # Redirect to path with trailing slash
                 self.send_response(301)
@@ -88,90 +199,201 @@ class RangeHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 return None
             for index in "index.html", "index.htm":
-                index = os.path.join(path, index)
-                if os.path.exists(index):
-                    path = index
+                f = file_cache.open(os.path.join(path, index))
+                if f is not None:
+                    path = os.path.join(path, index)
                     break
             else:
                 return http.server.SimpleHTTPRequestHandler.send_head(self)
         
-        # Check if file exists
-        if not os.path.exists(path):
-            return http.server.SimpleHTTPRequestHandler.send_head(self)
+        fs = f.stat
+        file_len = fs.st_size
+        ctype = self.guess_type(path)
+        etag = entity_tag(fs)
+        last_modified = http_date(fs.st_mtime)
+        cache_control = cache_control_for(self.path)
+        vary = "Accept-Encoding" if is_compressible(path) else None
         
-        # Get file info
-        try:
-            f = open(path, 'rb')
-        except IOError:
-            self.send_error(404, "File not found")
-            return None
+        # Whole-file requests get a precompressed variant when the client accepts one
+        encoding = None
+        encoded = None if 'Range' in self.headers else negotiate(
+            path, fs, self.headers.get('Accept-Encoding'), stat=file_cache.stat)
+        if encoded:
+            encoding, variant_path, _ = encoded
+            variant = file_cache.open(variant_path)
+            if variant is None:
+                encoding = None
+            else:
+                f.close()
+                f, file_len = variant, variant.stat.st_size
+                etag = encoded_etag(etag, encoding)
         
-        fs = os.fstat(f.fileno())
-        file_len = fs[6]
+        # Conditional GET - the client's cached copy is still current
+        if is_not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since'),
+                           etag, fs.st_mtime):
+            f.close()
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", cache_control)
+            if vary:
+                self.send_header("Vary", vary)
+            self.end_headers()
+            return None
         
-        # Check for Range header
+        # Check for Range header (ignored when If-Range no longer matches)
+        ranges = None
         range_header = self.headers.get('Range')
-        
-        if range_header:
-            # Parse range header
-            range_match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-            if range_match:
-                start = int(range_match.group(1))
-                end = range_match.group(2)
-                end = int(end) if end else file_len - 1
-                
-                # Ensure valid range
-                if start >= file_len:
-                    self.send_error(416, "Requested Range Not Satisfiable")
-                    return None
-                
-                end = min(end, file_len - 1)
-                length = end - start + 1
-                
-                # Send partial content response
-                self.send_response(206)
-                self.send_header("Content-Type", self.guess_type(path))
-                self.send_header("Content-Range", f"bytes {start}-{end}/{file_len}")
-                self.send_header("Content-Length", str(length))
-                self.send_header("Accept-Ranges", "bytes")
-                self.send_header("Cache-Control", "public, max-age=0")
+        if range_header and if_range_allows(self.headers.get('If-Range'), etag, fs.st_mtime):
+            try:
+                ranges = parse_range_header(range_header, file_len)
+            except RangeNotSatisfiable:
+                f.close()
+                self.body_size = file_len
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{file_len}")
+                self.send_header("Content-Length", "0")
                 self.end_headers()
-                
-                # Seek to start position and return file
-                f.seek(start)
-                return f
+                return None
         
-        # No range header - send full file
-        self.send_response(200)
-        self.send_header("Content-Type", self.guess_type(path))
-        self.send_header("Content-Length", str(file_len))
+        if ranges:
+            # Send partial content response (multipart/byteranges for several ranges)
+            body_type, segments, length, content_range = plan_range_response(ranges, file_len, ctype)
+            self.send_response(206)
+            self.send_header("Content-Type", body_type)
+            if content_range:
+                self.send_header("Content-Range", content_range)
+        else:
+            # No usable range - send full file
+            segments, length = [(0, file_len)], file_len
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+        
+        self.body_ranges = [list(r) for r in ranges] if ranges else None
+        self.body_size, self.body_length, self.body_encoding = file_len, length, encoding
+        self.send_header("Content-Length", str(length))
         self.send_header("Accept-Ranges", "bytes")
-        self.send_header("Cache-Control", "public, max-age=0")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", cache_control)
+        if vary:
+            self.send_header("Vary", vary)
         self.end_headers()
         
+        self.send_segments = segments
         return f
     
     def copyfile(self, source, outputfile):
         """Copy data with proper handling for broken pipes"""
+        metrics.OPEN_STREAMS.inc('static')
         try:
-            super().copyfile(source, outputfile)
-        except (BrokenPipeError, ConnectionResetError):
+            if self.send_segments is None:
+                start = source.tell()
+                super().copyfile(source, outputfile)
+                self.bytes_sent += source.tell() - start
+                return
+            for segment in self.send_segments:
+                if isinstance(segment, bytes):
+                    outputfile.write(segment)
+                    self.bytes_sent += len(segment)
+                else:
+                    self.send_file_range(source, *segment)
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
             # Client disconnected - this is normal for video seeking
-            pass
+            self.client_aborted = True
+        finally:
+            metrics.OPEN_STREAMS.dec('static')
+    
+    def send_file_range(self, source, offset, length):
+        """Send exactly ``length`` bytes of ``source`` starting at ``offset``
+
+        socket.sendfile() uses os.sendfile() so the bytes go from the page
+        cache to the socket without passing through Python, and falls back to
+        chunked send() calls on platforms or files where that is unavailable.
+        Either way nothing past the advertised Content-Length is read.
+        What went out is added to bytes_sent, also when the client goes away
+        part way (sendfile() leaves the file position after the last byte sent).
+        """
+        if length <= 0:
+            return
+        self.wfile.flush()
+        source.seek(offset)
+        try:
+            self.connection.sendfile(source, offset, length)
+        finally:
+            self.bytes_sent += source.tell() - offset
+
 
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCPServer that hands each connection to a bounded pool of worker threads
 
-def run_server(port=8000):
+    At most ``workers`` connections are served at once. Further connections
+    wait in the kernel listen queue (sized by ``backlog``) instead of piling
+    up in memory, and a client that stays silent for ``idle_timeout`` seconds
+    is disconnected so it cannot pin a worker.
+    """
+
+    # Allow socket reuse to prevent "Address already in use" errors
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler, workers=DEFAULT_WORKERS,
+                 backlog=DEFAULT_BACKLOG, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.workers = max(1, workers)
+        self.request_queue_size = max(1, backlog)
+        self.idle_timeout = idle_timeout if idle_timeout > 0 else None
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix='http-worker')
+        super().__init__(server_address, handler)
+
+    def process_request(self, request, client_address):
+        """Dispatch the connection to the pool, blocking while all workers are busy"""
+        request.settimeout(self.idle_timeout)
+        self._slots.acquire()
+        try:
+            self._pool.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        """Serve one connection on a worker thread"""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        """Stop accepting connections; in-flight requests run to completion"""
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_server(port=8000, workers=DEFAULT_WORKERS, backlog=DEFAULT_BACKLOG,
+               idle_timeout=DEFAULT_IDLE_TIMEOUT):
     """Start the HTTP server with Range support"""
     handler = RangeHTTPRequestHandler
     
-    # Allow socket reuse to prevent "Address already in use" errors
-    socketserver.TCPServer.allow_reuse_address = True
+    # Treat SIGTERM (docker stop) like Ctrl+C so pending visits get flushed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    
+    # Refresh .br/.gz copies of the site's text assets (no-op when up to date)
+    precompress_tree('.')
     
-    with socketserver.TCPServer(("", port), handler) as httpd:
+    with PooledHTTPServer(("", port), handler, workers=workers, backlog=backlog,
+                          idle_timeout=idle_timeout) as httpd:
         print(f"🚀 Srisin Family Website Server")
         print(f"📡 Server running at http://localhost:{port}")
         print(f"📁 Serving from: {os.getcwd()}")
         print(f"✨ Range requests enabled for video seeking")
+        print(f"🧵 Up to {httpd.workers} concurrent connections "
+              f"(backlog {httpd.request_queue_size}, idle timeout {idle_timeout}s)")
         print(f"\n⌨️  Press Ctrl+C to stop\n")
         
         try:
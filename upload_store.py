@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Content-addressed upload storage for admin_server.py
+Uploads are hashed while they stream in and stored once as <sha256><ext>,
+so identical bytes uploaded twice share a single file
+"""
+
+import os
+import re
+import time
+import hashlib
+import secrets
+from pathlib import Path
+
+COPY_BUFFER_SIZE = 1024 * 1024
+DIGEST_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+# Characters not allowed in file names on common systems, plus control characters
+UNSAFE_FILENAME_CHARS = re.compile(r'[\x00-\x1f\x7f\\/:*?"<>|]')
+MAX_FILENAME_LENGTH = 200
+
+# 0123...cdef.jpg, but not 0123...cdef__w640.jpg or legacy photo_20251220_123456_abc123.jpg
+STORED_NAME = re.compile(r'^(?P<digest>[0-9a-f]{64})(?P<ext>\.[a-z0-9]+)$')
+
+
+def clean_filename(filename):
+    """The name a file was uploaded as, safe to show and to save a download under
+
+    Directory parts and characters file systems reject are dropped, while
+    non-ASCII letters (Thai names) are kept. Returns None if nothing is left.
+    """
+    name = (filename or '').replace('\\', '/').rsplit('/', 1)[-1]
+    name = ' '.join(UNSAFE_FILENAME_CHARS.sub('', name).split()).strip(' .')
+    if len(name) > MAX_FILENAME_LENGTH:
+        stem, ext = os.path.splitext(name)
+        name = stem[:MAX_FILENAME_LENGTH - len(ext)] + ext
+    return name or None
+
+
+def is_digest(value):
+    """True if ``value`` looks like a lowercase SHA-256 hex digest"""
+    return isinstance(value, str) and DIGEST_PATTERN.fullmatch(value) is not None
+
+
+class UploadStore:
+    """Files in ``directory`` named after the SHA-256 of their bytes
+
+    ``extensions`` are the suffixes a stored file may have; a lookup by
+    digest tries each of them, so a client that already knows the hash of
+    a file can learn whether it is stored before sending any bytes.
+
+    New files are published with a hard link, which fails instead of
+    overwriting when the name already exists. Two concurrent uploads of the
+    same bytes therefore end with one file, and a stored file is never
+    replaced. ``prepare(tmp_path, filename)``, if given, may rewrite a new
+    file (faststart) before it is published; the name stays the digest of
+    the bytes that were uploaded.
+    """
+
+    def __init__(self, directory, extensions, prepare=None):
+        self.directory = Path(directory)
+        self.extensions = sorted({ext.lower().lstrip('.') for ext in extensions})
+        self.prepare = prepare
+
+    @staticmethod
+    def name_for(digest, filename):
+        """Stored name for bytes with ``digest`` uploaded as ``filename``"""
+        return f"{digest}{os.path.splitext(filename)[1].lower()}"
+
+    @staticmethod
+    def is_stored_name(name):
+        """True for names this store created (as opposed to legacy uploads)"""
+        return STORED_NAME.match(name) is not None
+
+    def find(self, digest):
+        """Return the stored name for ``digest``, or None
+
+        A hit marks the file as just used (access time only, so its
+        mtime-based ETag and any in-progress rewrite are unaffected).
+        """
+        if not is_digest(digest):
+            return None
+        for ext in self.extensions:
+            path = self.directory / f"{digest}.{ext}"
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+            return path.name
+        return None
+
+    def temp_path(self):
+        """A fresh temporary path inside the store, on the same filesystem"""
+        return self.directory / f".upload-{secrets.token_hex(8)}.tmp"
+
+    def save_stream(self, stream, filename):
+        """Copy ``stream`` into the store, hashing as it goes
+
+        Returns ``(name, digest, duplicate)``; when the bytes were already
+        stored the copy is discarded and ``duplicate`` is True.
+        """
+        hasher = hashlib.sha256()
+        tmp_path = self.temp_path()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+                    hasher.update(block)
+                    f.write(block)
+            digest = hasher.hexdigest()
+            name, duplicate = self.adopt(tmp_path, digest, filename)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return name, digest, duplicate
+
+    def adopt(self, tmp_path, digest, filename):
+        """Publish a file already written inside the store under its digest
+
+        ``tmp_path`` is removed either way. Returns ``(name, duplicate)``.
+        """
+        existing = self.find(digest)
+        if existing:
+            Path(tmp_path).unlink(missing_ok=True)
+            return existing, True
+
+        if self.prepare is not None:
+            self.prepare(tmp_path, filename)
+        name = self.name_for(digest, filename)
+        try:
+            os.link(tmp_path, self.directory / name)
+            duplicate = False
+        except FileExistsError:
+            duplicate = True   # Same bytes published by a concurrent upload
+        Path(tmp_path).unlink(missing_ok=True)
+        return name, duplicate
+
+    def idle_names(self, grace):
+        """Stored names not uploaded or looked up in the last ``grace`` seconds"""
+        cutoff = time.time() - grace
+        names = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not self.is_stored_name(entry.name):
+                    continue
+                try:
+                    if entry.is_file() and entry.stat().st_atime <= cutoff:
+                        names.append(entry.name)
+                except FileNotFoundError:
+                    continue
+        return names
+
+    def remove(self, name, grace=3600):
+        """Delete a stored file unless it was looked up in the last ``grace`` seconds
+
+        The grace period covers a duplicate upload that found the file just
+        before its last reference was dropped. Returns True if removed.
+        """
+        if not self.is_stored_name(name):
+            return False
+        path = self.directory / name
+        try:
+            if path.stat().st_atime > time.time() - grace:
+                return False
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        return True
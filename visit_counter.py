@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Write-behind visit counter shared by server.py and admin_server.py
+Increments happen in memory; a background thread merges them into the
+JSON counter file in batches, under a file lock and with an atomic rename
+"""
+
+import os
+import json
+import fcntl
+import atexit
+import threading
+from pathlib import Path
+from datetime import datetime
+
+# Flush after this many unsaved increments, or this many seconds, whichever first
+FLUSH_EVERY = 100
+FLUSH_INTERVAL = 5.0
+
+
+class VisitCounter:
+    """Visit count kept in memory and written behind to a JSON file
+
+    Each flush adds the locally pending increments to the value currently on
+    disk rather than overwriting it, so several processes sharing the file
+    never lose each other's visits.
+    """
+
+    def __init__(self, path, flush_every=FLUSH_EVERY, flush_interval=FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._base = self._read()
+        self._pending = 0
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+    @property
+    def count(self):
+        """Current count including increments not yet on disk"""
+        with self._lock:
+            return self._base + self._pending
+
+    def increment(self):
+        """Increment and return the visit count"""
+        with self._lock:
+            self._pending += 1
+            count = self._base + self._pending
+            due = self._pending >= self.flush_every
+        self._ensure_flusher()
+        if due:
+            self._wake.set()
+        return count
+
+    def flush(self):
+        """Merge pending increments into the counter file"""
+        with self._flush_lock:
+            with self._lock:
+                delta = self._pending
+                if not delta:
+                    return
+                self._pending = 0
+                self._base += delta
+            try:
+                total = self._merge(delta)
+            except OSError as e:
+                print(f"Error saving visit count: {e}")
+                with self._lock:
+                    self._base -= delta
+                    self._pending += delta
+                return
+            with self._lock:
+                self._base = total
+
+    def close(self):
+        """Stop the flusher thread and write out anything still pending"""
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+    def _ensure_flusher(self):
+        """Start the background flusher on first use"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='visit-counter-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        """Flush on a timer, or early when woken by increment()"""
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _read(self):
+        """Read the count stored on disk (0 if missing or unreadable)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('count', 0)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"Error loading visit count: {e}")
+            return 0
+
+    def _merge(self, delta):
+        """Add ``delta`` to the on-disk count and return the new total"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = self.path.with_name(self.path.name + '.lock')
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            total = self._read() + delta
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'count': total,
+                    'last_updated': datetime.now().isoformat()
+                }, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        return total